@@ -0,0 +1,64 @@
+"""notify on reminder and config changes
+
+Revision ID: 8f2d6c1a9b3e
+Revises: 41872c2a47bc
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d6c1a9b3e'
+down_revision: Union[str, None] = '41872c2a47bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table: primary key column sent in the notification
+WATCHED_TABLES = {
+    'reminders': 'id',
+    'guildconfigs': 'guildId',
+    'userconfigs': 'userId',
+}
+
+
+def upgrade() -> None:
+    # pg_notify's payload is capped at 8000 bytes, so only the primary key is sent. listeners re-fetch the row.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_row_change() RETURNS trigger AS $$
+        DECLARE
+            rec record;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := OLD;
+            ELSE
+                rec := NEW;
+            END IF;
+            PERFORM pg_notify(
+                'alexbot_row_changes',
+                json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'key', row_to_json(rec) ->> TG_ARGV[0])::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table, key in WATCHED_TABLES.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER "{table}_notify_row_change"
+            AFTER INSERT OR UPDATE OR DELETE ON "{table}"
+            FOR EACH ROW EXECUTE FUNCTION notify_row_change('{key}');
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in WATCHED_TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS "{table}_notify_row_change" ON "{table}";')
+    op.execute("DROP FUNCTION IF EXISTS notify_row_change();")
@@ -0,0 +1,40 @@
+"""index reminder listing and search
+
+Revision ID: d35a9e7b1f60
+Revises: b7e41f0c2d95
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd35a9e7b1f60'
+down_revision: Union[str, None] = 'b7e41f0c2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # listing and autocomplete filter by guild or owner, and page through the results by next_remind
+    op.create_index('ix_reminders_guildId_next_remind', 'reminders', ['guildId', 'next_remind', 'id'])
+    op.create_index('ix_reminders_owner_next_remind', 'reminders', ['owner', 'next_remind', 'id'])
+    # lets `message ILIKE '%...%'` use an index
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_reminders_message_trgm',
+        'reminders',
+        ['message'],
+        postgresql_using='gin',
+        postgresql_ops={'message': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reminders_message_trgm', table_name='reminders')
+    op.drop_index('ix_reminders_owner_next_remind', table_name='reminders')
+    op.drop_index('ix_reminders_guildId_next_remind', table_name='reminders')
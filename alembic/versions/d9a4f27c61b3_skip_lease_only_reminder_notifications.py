@@ -0,0 +1,54 @@
+"""skip lease only reminder notifications
+
+Revision ID: d9a4f27c61b3
+Revises: c3e8b1f5a290
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a4f27c61b3'
+down_revision: Union[str, None] = 'c3e8b1f5a290'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# every claim writes these. nobody else needs to hear about it, a process that wants the reminder claims it itself
+LEASE_COLUMNS = "'leased_by' - 'leased_until'"
+
+
+def upgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS "reminders_notify_row_change" ON "reminders";')
+    op.execute(
+        """
+        CREATE TRIGGER "reminders_notify_row_change"
+        AFTER INSERT OR DELETE ON "reminders"
+        FOR EACH ROW EXECUTE FUNCTION notify_row_change('id');
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER "reminders_notify_row_update"
+        AFTER UPDATE ON "reminders"
+        FOR EACH ROW
+        WHEN ((to_jsonb(OLD) - {LEASE_COLUMNS}) IS DISTINCT FROM (to_jsonb(NEW) - {LEASE_COLUMNS}))
+        EXECUTE FUNCTION notify_row_change('id');
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS "reminders_notify_row_update" ON "reminders";')
+    op.execute('DROP TRIGGER IF EXISTS "reminders_notify_row_change" ON "reminders";')
+    op.execute(
+        """
+        CREATE TRIGGER "reminders_notify_row_change"
+        AFTER INSERT OR UPDATE OR DELETE ON "reminders"
+        FOR EACH ROW EXECUTE FUNCTION notify_row_change('id');
+        """
+    )
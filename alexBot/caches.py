@@ -0,0 +1,380 @@
+import datetime
+import fcntl
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from alexBot.database import Base, GuildConfig, Transcription, UserConfig, async_session
+
+log = logging.getLogger(__name__)
+
+_M = TypeVar("_M", bound=Base)
+
+
+async def get_or_create_many(Model: Type[_M], keys: Iterable[int]) -> List[_M]:
+    """
+    fetch the rows for `keys` from a single-primary-key config table, inserting default rows for any that are missing.
+    one select, plus one `INSERT ... ON CONFLICT DO NOTHING RETURNING` if anything was missing.
+    """
+    pk = Model.__mapper__.primary_key[0]
+    keys = list(dict.fromkeys(keys))
+    async with async_session() as session:
+        async with session.begin():
+            rows = list(await session.scalars(select(Model).where(pk.in_(keys))))
+            found = {getattr(row, pk.key) for row in rows}
+            missing = [key for key in keys if key not in found]
+            if missing:
+                stmt = insert(Model).values([{pk.key: key} for key in missing]).on_conflict_do_nothing()
+                rows += await session.scalars(stmt.returning(Model))
+                found = {getattr(row, pk.key) for row in rows}
+                if raced := [key for key in missing if key not in found]:
+                    # someone else inserted these between our select and insert
+                    rows += await session.scalars(select(Model).where(pk.in_(raced)))
+    return rows
+
+
+class GuildConfigCache:
+    """
+    write-through cache of every GuildConfig the bot knows about, keyed by guildId.
+    loaded once on startup, so message listeners don't touch the database in the steady state.
+    objects handed out are shared, treat them as read only. writes go through `set`.
+    """
+
+    def __init__(self):
+        self._configs: Dict[int, GuildConfig] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def load(self):
+        """loads every GuildConfig in one query."""
+        async with async_session() as session:
+            configs = await session.scalars(select(GuildConfig))
+            self._configs = {config.guildId: config for config in configs}
+        log.info(f"loaded {len(self._configs)} guild configs")
+
+    async def get(self, guildId: int) -> GuildConfig:
+        """returns the config for this guild, creating a default one if it doesn't exist yet."""
+        if (config := self._configs.get(guildId)) is not None:
+            self.hits += 1
+            return config
+        self.misses += 1
+        config = (await get_or_create_many(GuildConfig, [guildId]))[0]
+        self._configs[guildId] = config
+        return config
+
+    async def refresh(self, guildId: int):
+        """re-read a guild's config after it was changed somewhere else."""
+        async with async_session() as session:
+            config = await session.get(GuildConfig, guildId)
+        if config is None:
+            self.invalidate(guildId)
+        else:
+            self.set(config)
+
+    def set(self, config: GuildConfig):
+        """store a config that was just committed to the database."""
+        self._configs[config.guildId] = config
+
+    def invalidate(self, guildId: int):
+        self._configs.pop(guildId, None)
+
+
+class UserConfigCache:
+    """
+    LRU cache of UserConfigs with a time to live, so edits made by other processes are picked up eventually.
+    objects handed out are shared, treat them as read only. writes go through `update` or `set`.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 10 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._configs: OrderedDict[int, Tuple[float, UserConfig]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _get_cached(self, userId: int) -> Optional[UserConfig]:
+        entry = self._configs.get(userId)
+        if entry is None:
+            return None
+        expires, config = entry
+        if expires < time.monotonic():
+            del self._configs[userId]
+            return None
+        self._configs.move_to_end(userId)
+        return config
+
+    async def get_or_create(self, userId: int) -> UserConfig:
+        """returns the config for this user, creating a default one if it doesn't exist yet."""
+        return (await self.get_many([userId]))[userId]
+
+    async def get_many(self, userIds: Iterable[int]) -> Dict[int, UserConfig]:
+        """like get_or_create, but for a batch of users. everything not cached is resolved in one round trip."""
+        configs: Dict[int, UserConfig] = {}
+        missing: List[int] = []
+        for userId in userIds:
+            if (config := self._get_cached(userId)) is not None:
+                self.hits += 1
+                configs[userId] = config
+            else:
+                self.misses += 1
+                missing.append(userId)
+        if missing:
+            for config in await get_or_create_many(UserConfig, missing):
+                self.set(config)
+                configs[config.userId] = config
+        return configs
+
+    async def update(self, userId: int, **values) -> UserConfig:
+        """write `values` to the user's row (which must exist) and cache the result."""
+        async with async_session() as session:
+            async with session.begin():
+                config = await session.scalar(
+                    update(UserConfig).where(UserConfig.userId == userId).values(**values).returning(UserConfig)
+                )
+        self.set(config)
+        return config
+
+    async def refresh(self, userId: int):
+        """
+        re-read a cached user's config after it changed, instead of dropping it: most changes are our own writes,
+        which the change feed tells us about right after they were cached. users that aren't cached are left alone.
+        """
+        if userId not in self._configs:
+            return
+        async with async_session() as session:
+            config = await session.get(UserConfig, userId)
+        if config is None:
+            self.invalidate(userId)
+        else:
+            self.set(config)
+
+    def set(self, config: UserConfig):
+        """store a config that was just committed to the database."""
+        self._configs[config.userId] = (time.monotonic() + self.ttl, config)
+        self._configs.move_to_end(config.userId)
+        while len(self._configs) > self.maxsize:
+            self._configs.popitem(last=False)
+
+    def invalidate(self, userId: int):
+        self._configs.pop(userId, None)
+
+    def clear(self):
+        self._configs.clear()
+
+
+class TranscriptionCache:
+    """
+    LRU cache in front of the transcriptions table. looked up by attachment id before the audio is downloaded,
+    and by content hash after, so the same clip posted or forwarded again isn't transcribed twice.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        # attachment id: (content hash, text)
+        self._byAttachment: OrderedDict[int, Tuple[str, str]] = OrderedDict()
+        self._byHash: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._byAttachment)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _remember(self, attachmentId: int, contentHash: str, text: str):
+        self._byAttachment[attachmentId] = (contentHash, text)
+        self._byAttachment.move_to_end(attachmentId)
+        self._byHash[contentHash] = text
+        while len(self._byAttachment) > self.maxsize:
+            _, (oldHash, _) = self._byAttachment.popitem(last=False)
+            if oldHash not in (entry[0] for entry in self._byAttachment.values()):
+                self._byHash.pop(oldHash, None)
+
+    async def get(self, attachmentId: int) -> Optional[str]:
+        """the transcription of an attachment, if it was transcribed before"""
+        if (entry := self._byAttachment.get(attachmentId)) is not None:
+            self.hits += 1
+            self._byAttachment.move_to_end(attachmentId)
+            return entry[1]
+        async with async_session() as session:
+            row = await session.get(Transcription, attachmentId)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(row.attachmentId, row.contentHash, row.text)
+        return row.text
+
+    async def get_by_hash(self, attachmentId: int, contentHash: str) -> Optional[str]:
+        """
+        the transcription of the same audio under another attachment, if there is one.
+        it's stored for `attachmentId` too, so the next lookup doesn't need the audio
+        """
+        text = self._byHash.get(contentHash)
+        if text is None:
+            async with async_session() as session:
+                text = await session.scalar(
+                    select(Transcription.text).where(Transcription.contentHash == contentHash).limit(1)
+                )
+        if text is None:
+            return None
+        await self.put(attachmentId, contentHash, text)
+        return text
+
+    async def put(self, attachmentId: int, contentHash: str, text: str):
+        async with async_session() as session:
+            async with session.begin():
+                await session.execute(
+                    insert(Transcription)
+                    .values(
+                        attachmentId=attachmentId,
+                        contentHash=contentHash,
+                        text=text,
+                        created=datetime.datetime.now(datetime.UTC),
+                    )
+                    .on_conflict_do_nothing()
+                )
+        self._remember(attachmentId, contentHash, text)
+
+
+class DiskLRUCache:
+    """
+    size-bounded cache of files on disk, evicting the least recently used entries once it's over `maxBytes`.
+    each entry is a directory named after the hash of its key, holding one file that keeps its original name.
+    the index is rebuilt from the directory on startup, ordered by when entries were last used.
+    a directory is only used by one process at a time, see _claim.
+    """
+
+    def __init__(self, directory: str, maxBytes: int):
+        self.directory = self._claim(directory)
+        self.maxBytes = maxBytes
+        # key hash: (path, size)
+        self._entries: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._tmp = os.path.join(directory, "tmp")
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        os.makedirs(self._tmp, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _claim(self, directory: str) -> str:
+        """
+        lock `directory` for this process, and return it. another process sharing it would wipe our downloads in
+        progress on startup and evict files from under us, so when it's taken the first free one of directory-1,
+        directory-2... is used instead. the lock goes away with the process, so a restart gets its directory back.
+        """
+        for n in itertools.count():
+            path = directory if n == 0 else f"{directory}-{n}"
+            os.makedirs(path, exist_ok=True)
+            lock = open(os.path.join(path, "lock"), "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            # held open for as long as we live
+            self._lock = lock
+            if n:
+                log.info(f"{directory} is in use by another process, using {path}")
+            return path
+
+    def _load(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name == "tmp" or not entry.is_dir():
+                continue
+            files = [file for file in os.scandir(entry.path) if file.is_file()]
+            if len(files) != 1:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            stat = files[0].stat()
+            found.append((stat.st_mtime, entry.name, files[0].path, stat.st_size))
+        for _, digest, path, size in sorted(found):
+            self._entries[digest] = (path, size)
+            self.size += size
+        log.info(f"loaded {len(self._entries)} cached files ({self.size} bytes) from {self.directory}")
+        self._evict()
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def tempdir(self) -> tempfile.TemporaryDirectory:
+        """a scratch directory on the same filesystem as the cache, so `put` is a rename"""
+        return tempfile.TemporaryDirectory(dir=self._tmp, ignore_cleanup_errors=True)
+
+    def get(self, key: str) -> Optional[str]:
+        """the path of the cached file for `key`, if there is one"""
+        digest = self._digest(key)
+        entry = self._entries.get(digest)
+        if entry is None or not os.path.exists(entry[0]):
+            if entry is not None:
+                self._remove(digest)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(digest)
+        os.utime(entry[0])
+        return entry[0]
+
+    def put(self, key: str, source: str, filename: str) -> str:
+        """move `source` into the cache as `filename`, and return its new path"""
+        digest = self._digest(key)
+        if digest in self._entries:
+            self._remove(digest)
+        entryDir = os.path.join(self.directory, digest)
+        os.makedirs(entryDir, exist_ok=True)
+        path = os.path.join(entryDir, os.path.basename(filename))
+        shutil.move(source, path)
+        size = os.path.getsize(path)
+        self._entries[digest] = (path, size)
+        self.size += size
+        self._evict()
+        return path
+
+    def _remove(self, digest: str):
+        path, size = self._entries.pop(digest)
+        self.size -= size
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    def _evict(self):
+        # files handed out before they're evicted stay readable through their open handles
+        while self.size > self.maxBytes and self._entries:
+            self._remove(next(iter(self._entries)))
@@ -1,10 +1,14 @@
 import enum
+import functools
 from dataclasses import asdict, dataclass, field
-from typing import Callable, Dict, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
 
 import discord
 import feedparser
 
+if TYPE_CHECKING:
+    from alexBot.database import GuildConfig, UserConfig
+
 
 @dataclass
 class RingRate:
@@ -26,6 +30,54 @@ class MovieSuggestion:
     watchdate: str
 
 
+@dataclass
+class VoiceEvent:
+    """
+    a voice_state_update, classified once by the bot and dispatched to cogs as `on_voice_event`.
+    channel is before.channel or after.channel. member counts exclude bots, and are taken after the update.
+    userConfig is only resolved when the member changed channels.
+    """
+
+    member: discord.Member
+    before: discord.VoiceState
+    after: discord.VoiceState
+    guildConfig: "GuildConfig"
+    userConfig: Optional["UserConfig"] = None
+
+    @property
+    def channel(self) -> Union[discord.VoiceChannel, discord.StageChannel]:
+        return self.before.channel or self.after.channel  # type: ignore
+
+    @property
+    def joined(self) -> bool:
+        return self.before.channel is None and self.after.channel is not None
+
+    @property
+    def left(self) -> bool:
+        return self.before.channel is not None and self.after.channel is None
+
+    @property
+    def moved(self) -> bool:
+        return (
+            self.before.channel is not None
+            and self.after.channel is not None
+            and self.before.channel != self.after.channel
+        )
+
+    @property
+    def stateChange(self) -> bool:
+        """the member stayed in the same channel, only their mute/deafen/stream state changed"""
+        return self.before.channel is not None and self.before.channel == self.after.channel
+
+    @functools.cached_property
+    def humansBefore(self) -> int:
+        return len([m for m in self.before.channel.members if not m.bot]) if self.before.channel else 0
+
+    @functools.cached_property
+    def humansAfter(self) -> int:
+        return len([m for m in self.after.channel.members if not m.bot]) if self.after.channel else 0
+
+
 class SugeryZone(enum.Enum):
     VERYLOW = enum.auto()
     LOW = enum.auto()
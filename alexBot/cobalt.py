@@ -1,17 +1,34 @@
+import asyncio
 import os
+import time
 from dataclasses import asdict, dataclass
-from typing import Dict, List, Literal, Optional
+from typing import Dict, List, Literal, Optional, Sequence
 
-import urllib.request
 import logging
 
 import aiohttp
 
+from alexBot import metrics
+
 ENDPOINT = os.environ.get("COBALT_URL") or "http://cobalt-api:9000"
 FALLBACK_ENDPOINT = "https://api.cobalt.tools/"
 
 DEFAULT_HEADERS = {"Accept": "application/json", "Content-Type": "application/json", "User-Agent": "alexBot/1.0"}
 
+# open connections shared by api calls and tunnel downloads
+CONNECTION_LIMIT = 20
+# tunnel downloads can take a while, but shouldn't stall
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=60)
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+HEALTH_INTERVAL = 60
+# consecutive failures before an endpoint is skipped, and for how long (seconds) at first
+FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 30
+
+REQUEST_TIME = metrics.register(
+    metrics.Histogram("alexbot_cobalt_request_seconds", "cobalt api response time", label="endpoint")
+)
+
 log = logging.getLogger(__name__)
 
 
@@ -87,32 +104,116 @@ class ServerInfo:
     git: GitServerData
 
 
+@dataclass
+class Endpoint:
+    url: str
+    # lower is tried first
+    priority: int
+    failures: int = 0
+    # while the circuit is open the endpoint is skipped, until a health probe (or this time) lets it back in
+    open_until: float = 0.0
+    # moving average of response times, in seconds
+    latency: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+
 class Cobalt:
-    def __init__(self) -> None:
-        # make a request to ENDPOINT and check if it's up, if not, set to fallback server
+    """
+    a client for one or more cobalt instances, sharing one pooled aiohttp session for api calls and tunnel downloads.
+    endpoints are tried in priority order, skipping ones whose circuit breaker is open. failing endpoints are
+    taken out for a while, and health probes bring them back as soon as they answer again.
+    """
+
+    def __init__(self, endpoints: Sequence[str] = (ENDPOINT, FALLBACK_ENDPOINT)) -> None:
+        self.endpoints = [Endpoint(url, priority) for priority, url in enumerate(endpoints)]
+        self.headers = DEFAULT_HEADERS
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=CONNECTION_LIMIT, ttl_dns_cache=300),
+                timeout=REQUEST_TIMEOUT,
+            )
+        return self._session
+
+    def start(self):
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+        if self._session:
+            await self._session.close()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*[self.probe(endpoint) for endpoint in self.endpoints])
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    def ordered_endpoints(self) -> List[Endpoint]:
+        """available endpoints first, by priority. if they're all broken, try them all anyway"""
+        available = [endpoint for endpoint in self.endpoints if endpoint.available]
+        return sorted(available or self.endpoints, key=lambda endpoint: endpoint.priority)
+
+    def _record_success(self, endpoint: Endpoint, latency: float):
+        if endpoint.failures >= FAILURE_THRESHOLD:
+            log.info(f"Cobalt API {endpoint.url} is back")
+        endpoint.failures = 0
+        endpoint.open_until = 0.0
+        endpoint.latency = latency if endpoint.latency is None else 0.8 * endpoint.latency + 0.2 * latency
+        REQUEST_TIME.observe(latency, endpoint.url)
+
+    def _record_failure(self, endpoint: Endpoint, error: BaseException):
+        endpoint.failures += 1
+        if endpoint.failures >= FAILURE_THRESHOLD:
+            # back off harder the longer it stays down, up to 16x
+            backoff = BREAKER_COOLDOWN * 2 ** min(endpoint.failures - FAILURE_THRESHOLD, 4)
+            endpoint.open_until = time.monotonic() + backoff
+            log.warning(f"Cobalt API {endpoint.url} is down ({error!r}), skipping it for {backoff} seconds")
+
+    async def probe(self, endpoint: Endpoint):
+        started = time.monotonic()
         try:
-            contents = urllib.request.urlopen(ENDPOINT).read()
-        except Exception:
-            contents = None
-        if contents is None:
-            self.endpoint = FALLBACK_ENDPOINT
-            log.warning(f"Cobalt API {ENDPOINT} is down, using fallback server ({FALLBACK_ENDPOINT})")
+            async with self.session.get(endpoint.url, timeout=PROBE_TIMEOUT) as resp:
+                resp.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._record_failure(endpoint, e)
         else:
-            self.endpoint = ENDPOINT
-        self.headers = DEFAULT_HEADERS
+            self._record_success(endpoint, time.monotonic() - started)
+
+    async def _request(self, method: str, **kwargs) -> Dict:
+        error: Optional[BaseException] = None
+        for endpoint in self.ordered_endpoints():
+            started = time.monotonic()
+            try:
+                async with self.session.request(method, endpoint.url, **kwargs) as resp:
+                    if resp.status >= 500:
+                        resp.raise_for_status()
+                    data = await resp.json()
+            # an instance answering with an html error page, or broken json, is as down as one that doesn't answer
+            except (aiohttp.ClientError, aiohttp.ContentTypeError, ValueError, asyncio.TimeoutError) as e:
+                self._record_failure(endpoint, e)
+                error = e
+                continue
+            self._record_success(endpoint, time.monotonic() - started)
+            return data
+        raise error or Exception("no cobalt endpoints configured")
 
     async def get_server_info(self) -> ServerInfo:
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            async with session.get(self.endpoint) as resp:
-                data = await resp.json()
-                return ServerInfo(cobalt=CobaltServerData(**data['cobalt']), git=GitServerData(**data['git']))
+        data = await self._request("GET")
+        return ServerInfo(cobalt=CobaltServerData(**data['cobalt']), git=GitServerData(**data['git']))
 
     async def process(self, request_body: RequestBody) -> ResponceBody:
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            async with session.post(self.endpoint, json=request_body.dict()) as resp:
-                rb = ResponceBody(**await resp.json())
-                if rb.status == "picker":
-                    rb._picker = rb.picker
-                    rb.picker = [Picker(**p) for p in rb._picker]  # type: ignore
-
-                return rb
+        rb = ResponceBody(**await self._request("POST", json=request_body.dict()))
+        if rb.status == "picker":
+            rb._picker = rb.picker
+            rb.picker = [Picker(**p) for p in rb._picker]  # type: ignore
+
+        return rb
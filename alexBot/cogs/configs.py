@@ -8,6 +8,7 @@ from sqlalchemy import select
 
 from alexBot.classes import googleVoices
 from alexBot.database import GuildConfig, UserConfig, async_session
+from alexBot.transcription import MODELS
 
 from ..tools import Cog, convert_to_bool
 
@@ -31,26 +32,23 @@ class Configs(Cog):
 
     @configUserCommandGroup.command(name="show", description="shows the current config")
     async def user_showConfig(self, interaction: discord.Interaction):
-        async with async_session() as session:
-            config = await session.scalar(select(UserConfig).where(UserConfig.userId == interaction.user.id))
-            if not config:
-                config = UserConfig(userId=interaction.user.id)
-                session.add(config)
-                await session.commit()
-            embed = discord.Embed()
-            embed.title = f"User Config for {interaction.user.name}"
-            embed.set_author(
-                name=interaction.user.display_name,
-                icon_url=interaction.user.avatar.url if interaction.user.avatar else None,
-            )
-            for key in config.__config_keys__:
-                embed.add_field(name=key, value=f"{getattr(config, key)} - {UserConfig.__config_docs__[key]}")
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+        config = await self.bot.userConfigs.get_or_create(interaction.user.id)
+        embed = discord.Embed()
+        embed.title = f"User Config for {interaction.user.name}"
+        embed.set_author(
+            name=interaction.user.display_name,
+            icon_url=interaction.user.avatar.url if interaction.user.avatar else None,
+        )
+        for key in config.__config_keys__:
+            embed.add_field(name=key, value=f"{getattr(config, key)} - {UserConfig.__config_docs__[key]}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
     async def value_autocomplete(self, interaction: discord.Interaction, guess: str) -> List[app_commands.Choice]:
         if interaction.command == self.user_setConfig and interaction.namespace.key == 'voiceModel':
             chc = [app_commands.Choice(name=f"{vc[0]} ({vc[1]})", value=vc[0]) for vc in googleVoices]
             return chc
+        if interaction.command == self.guild_setConfig and interaction.namespace.key == 'transcriptionModel':
+            return [app_commands.Choice(name=model, value=model) for model in ("auto", *MODELS)]
         if interaction.namespace.key == 'timeZone':
             return [
                 app_commands.Choice(name=zone, value=zone) for zone in common_timezones if guess.lower() in zone.lower()
@@ -131,26 +129,25 @@ class Configs(Cog):
             setattr(uc, key, val)
             session.add(uc)
             await session.commit()
+        if Model is GuildConfig:
+            self.bot.guildConfigs.set(uc)
+        else:
+            self.bot.userConfigs.set(uc)
         await interaction.response.send_message(
             f"Set {key} to {val}", ephemeral=config_type != 'guild'
         )
 
     @configGuildCommandGroup.command(name="show", description="shows the current config")
     async def guild_showConfig(self, interaction: discord.Interaction):
-        async with async_session() as session:
-            config = await session.scalar(select(GuildConfig).where(GuildConfig.guildId == interaction.guild.id))
-            if not config:
-                config = GuildConfig(guildId=interaction.guild.id)
-                session.add(config)
-                await session.commit()
-            embed = discord.Embed()
-            embed.title = f"Guild Config for {interaction.guild.name}"
-            embed.set_author(
-                name=interaction.guild.name, icon_url=interaction.guild.icon.url if interaction.guild.icon else None
-            )
-            for key in config.__config_keys__:
-                embed.add_field(name=key, value=f"{getattr(config, key)}\n{GuildConfig.__config_docs__[key]}")
-            await interaction.response.send_message(embed=embed, ephemeral=False)
+        config = await self.bot.guildConfigs.get(interaction.guild.id)
+        embed = discord.Embed()
+        embed.title = f"Guild Config for {interaction.guild.name}"
+        embed.set_author(
+            name=interaction.guild.name, icon_url=interaction.guild.icon.url if interaction.guild.icon else None
+        )
+        for key in config.__config_keys__:
+            embed.add_field(name=key, value=f"{getattr(config, key)}\n{GuildConfig.__config_docs__[key]}")
+        await interaction.response.send_message(embed=embed, ephemeral=False)
 
     @configGuildCommandGroup.command(name="set", description="sets a config value")
     @app_commands.choices(
@@ -169,6 +166,9 @@ class Configs(Cog):
                 "You don't have permission to do that! (need Manage Guild)", ephemeral=True
             )
             return
+        if key == 'transcriptionModel' and value not in ("auto", *MODELS):
+            await interaction.response.send_message("Invalid transcription model", ephemeral=True)
+            return
         # from here it's identical to user_setConfig, so we call into set_config
         await self.setConfig('guild', interaction, key, value)
 
@@ -8,10 +8,6 @@ import discord
 from discord import MessageType, PartialEmoji, app_commands, ui
 from discord.ext import commands
 from emoji_data import EmojiSequence
-from sqlalchemy import select
-
-from alexBot import database as db
-
 from ..tools import Cog, get_json
 
 log = logging.getLogger(__name__)
@@ -155,14 +151,7 @@ class Fun(Cog):
     async def on_message(self, message: discord.Message):
         if message.guild is None:
             return
-        cfg = None
-        async with db.async_session() as session:
-            cfg = await session.scalar(select(db.GuildConfig).where(db.GuildConfig.guildId == message.guild.id))
-            if not cfg:
-                # we need to create a new default config for this guild
-                async with session.begin():
-                    cfg = db.GuildConfig(guildId=message.guild.id)
-                    session.add(cfg)
+        cfg = await self.bot.guildConfigs.get(message.guild.id)
         if cfg.ayy:
             if AYYGEN.fullmatch(message.content):
                 await message.reply("lmao", mention_author=False)
@@ -5,10 +5,6 @@ from typing import Optional
 import discord
 import mcstatus
 from discord import app_commands
-from sqlalchemy import select
-
-from alexBot import database as db
-
 from ..tools import Cog
 
 log = logging.getLogger(__name__)
@@ -21,11 +17,8 @@ class Minecraft(Cog):
     async def mcStatus(self, interaction: discord.Interaction, server: Optional[str] = None):
         if server is None and interaction.guild is not None:
             #  retrive server from database if not provided
-            async with db.async_session() as session:
-                if cfg := await session.scalar(
-                    select(db.GuildConfig).where(db.GuildConfig.guildId == interaction.guild.id)
-                ):
-                    server = cfg.minecraft if cfg.minecraft else None
+            cfg = await self.bot.guildConfigs.get(interaction.guild.id)
+            server = cfg.minecraft if cfg.minecraft else None
 
         if server is None:
             return await interaction.response.send_message(
@@ -1,72 +1,355 @@
 import asyncio
 import datetime
 import logging
+import os
 import random
+import socket
 import uuid
 from functools import lru_cache
-from typing import Coroutine, Dict, List, Optional
+from typing import AsyncIterator, Coroutine, Dict, List, Optional, Set
 
 import discord
 from discord import app_commands
 from discord.ext.commands import Paginator
 import pytz
-from sqlalchemy import and_, or_, select
+from sqlalchemy import DateTime, column, delete, func, or_, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import UUID
 
 from alexBot import database as db
-from alexBot.database import Reminder, UserConfig
-from alexBot.tools import Cog, InteractionPaginator, resolve_duration, time_cache
+from alexBot import metrics
+from alexBot.database import PendingClear, Reminder
+from alexBot.tools import (
+    Cog,
+    DeadlineQueue,
+    InteractionPaginator,
+    grouper,
+    next_occurrence,
+    resolve_duration,
+    time_cache,
+)
 
 log = logging.getLogger(__name__)
 
 
 class ClearReminderView(discord.ui.View):
-    def __init__(
-        self,
-    ):
+    """
+    the clear button on require_clearing reminders. registered as a persistent view, so buttons on
+    messages sent before a restart keep working. the pending clear is looked up by the button's message.
+    """
+
+    def __init__(self, cog: "Reminders", cleared: bool = False):
         super().__init__(timeout=None)
-        self.waiting = True
-        self.times = 0
+        self.cog = cog
+        self.clear.disabled = cleared
 
-    @discord.ui.button(label="Clear", style=discord.ButtonStyle.red)
+    @discord.ui.button(label="Clear", style=discord.ButtonStyle.red, custom_id="reminders:clear")
     async def clear(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.waiting = False
-        await interaction.response.send_message("Reminder cleared", ephemeral=True)
-        button.disabled = True
-        await interaction.edit_original_response(view=self)
-        self.stop()
+        await interaction.response.edit_message(view=ClearReminderView(self.cog, cleared=True))
+        await self.cog.clear_pending([interaction.message.id])
+        await interaction.followup.send("Reminder cleared", ephemeral=True)
+
+
+# how late a reminder can fire before it's treated as overdue
+OVERDUE_GRACE = datetime.timedelta(minutes=1)
+# how long a process may hold a reminder while sending it
+LEASE_TIME = datetime.timedelta(minutes=5)
+# allowance for clock drift between us and the database when claiming due reminders
+CLAIM_SLACK = datetime.timedelta(seconds=30)
+# due reminders claimed per transaction. postgres takes at most 32767 query parameters, and these use one or two each
+CLAIM_BATCH = 1000
+# identifies this process in Reminder.leased_by
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}"
+# rows fetched per query when listing reminders
+LIST_PAGE_SIZE = 25
+# discord shows at most 25 autocomplete choices
+AUTOCOMPLETE_LIMIT = 25
+# require_clearing reminders are repeated every NAG_INTERVAL until acked, at most MAX_NAGS times
+NAG_INTERVAL = datetime.timedelta(minutes=5)
+MAX_NAGS = 8
+# how long to wait before trying again when claiming or skipping due reminders fails
+RETRY_DELAY = datetime.timedelta(seconds=30)
+
+DELIVERY_LAG = metrics.register(
+    metrics.Histogram(
+        "alexbot_reminder_delivery_lag_seconds",
+        "time between a reminder's next_remind and it being sent",
+        buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+    )
+)
 
 
 class Reminders(Cog):
-    tasks: Dict[uuid.UUID, asyncio.Task] = {}
-    remind_loop: asyncio.Task = None
+    def __init__(self, bot):
+        super().__init__(bot)
+        # reminders currently being sent
+        self.tasks: Dict[uuid.UUID, asyncio.Task] = {}
+        # reminders waiting for their next_remind, and the heap that wakes us up for them
+        self.pending: Dict[uuid.UUID, Reminder] = {}
+        self.queue: DeadlineQueue[uuid.UUID] = DeadlineQueue()
+        self.remind_loop: Optional[asyncio.Task] = None
+        # require_clearing reminders waiting for an ack, by message id and by channel id, and when to nag them next
+        self.clears: Dict[int, PendingClear] = {}
+        self.clearsByChannel: Dict[int, Set[int]] = {}
+        self.nags: DeadlineQueue[int] = DeadlineQueue()
+        self.nag_loop: Optional[asyncio.Task] = None
+        self.clear_view = ClearReminderView(self)
 
     async def cog_load(self):
-        # get overdue and soon reminders
+        self.bot.add_view(self.clear_view)
         self.remind_loop = self.bot.loop.create_task(self.reminder_loop())
+        self.nag_loop = self.bot.loop.create_task(self.pending_clear_loop())
 
     async def cog_unload(self) -> None:
         self.remind_loop.cancel()
+        self.nag_loop.cancel()
         for item in self.tasks.values():
             item.cancel()
 
+    def schedule(self, reminder: Reminder):
+        """queue (or re-queue) a reminder to be sent at its next_remind, or when another process's lease on it ends"""
+        deadline = reminder.next_remind
+        if reminder.leased_until and reminder.leased_until > deadline:
+            deadline = reminder.leased_until
+        self.pending[reminder.id] = reminder
+        self.queue.add(reminder.id, deadline)
+
+    def unschedule(self, reminderId: uuid.UUID):
+        self.pending.pop(reminderId, None)
+        self.queue.remove(reminderId)
+
+    async def load_reminders(self):
+        async with db.async_session() as session:
+            reminders = {reminder.id: reminder for reminder in await session.scalars(select(Reminder))}
+        for reminderId in list(self.pending):
+            if reminderId not in reminders:
+                self.unschedule(reminderId)
+        for reminder in reminders.values():
+            if reminder.id not in self.tasks:
+                self.schedule(reminder)
+        log.info(f"scheduled {len(self.pending)} reminders")
+
     async def reminder_loop(self):
+        # load every reminder once. after this, the schedule is kept up to date by schedule / unschedule,
+        # and by the database's change feed
+        await self.load_reminders()
         while True:
-            async with db.async_session() as session:
-                time_soon = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=2)
-                stmt = select(Reminder).where(
-                    and_(Reminder.next_remind <= time_soon, Reminder.id.not_in(self.tasks.keys()))
+            due = [self.pending.pop(reminderId) for reminderId in await self.queue.next_due()]
+            for batch in grouper(due, CLAIM_BATCH):
+                for reminder in await self.claim_and_skip(list(batch)):
+                    self.tasks[reminder.id] = self.bot.loop.create_task(self.remind(reminder))
+
+    async def claim_and_skip(self, due: List[Reminder]) -> List[Reminder]:
+        """claim due reminders, and skip the missed recurring ones. returns the ones to send now"""
+        try:
+            claimed = await self.claim(due)
+        except Exception as e:
+            log.exception(e)
+            self.retry_soon(due)
+            return []
+        # recurring reminders we missed (ie, the bot was down) skip to their next time instead of being sent
+        skipped = [reminder for reminder in claimed if reminder.frequency and self._is_overdue(reminder)]
+        if skipped:
+            try:
+                await self.skip_missed(skipped)
+            except Exception as e:
+                log.exception(e)
+                self.retry_soon(skipped)
+        skippedIds = {reminder.id for reminder in skipped}
+        return [reminder for reminder in claimed if reminder.id not in skippedIds]
+
+    def retry_soon(self, reminders: List[Reminder]):
+        """queue reminders again RETRY_DELAY from now, after the database failed us"""
+        retryAt = datetime.datetime.now(datetime.UTC) + RETRY_DELAY
+        for reminder in reminders:
+            self.pending[reminder.id] = reminder
+            self.queue.add(reminder.id, retryAt)
+
+    async def claim(self, reminders: List[Reminder]) -> List[Reminder]:
+        """
+        lease due reminders to this process, so that only one bot process sends each one.
+        rows locked or leased by another process are skipped, and looked at again once that lease could have ended.
+        """
+        ids = [reminder.id for reminder in reminders]
+        claimable = (
+            select(Reminder.id)
+            .where(
+                Reminder.id.in_(ids),
+                Reminder.next_remind <= func.now() + CLAIM_SLACK,
+                or_(Reminder.leased_until == None, Reminder.leased_until < func.now()),
+            )
+            .with_for_update(skip_locked=True)
+        )
+        async with db.async_session() as session:
+            async with session.begin():
+                claimed = list(
+                    await session.scalars(
+                        update(Reminder)
+                        .where(Reminder.id.in_(claimable))
+                        .values(leased_by=INSTANCE_ID, leased_until=func.now() + LEASE_TIME)
+                        .returning(Reminder)
+                        .execution_options(synchronize_session=False)
+                    )
+                )
+                claimedIds = {reminder.id for reminder in claimed}
+                if unclaimed := [reminderId for reminderId in ids if reminderId not in claimedIds]:
+                    # someone else has these (or already sent them). queue them again from their current row
+                    for reminder in await session.scalars(select(Reminder).where(Reminder.id.in_(unclaimed))):
+                        self.schedule(reminder)
+        return claimed
+
+    async def skip_missed(self, reminders: List[Reminder]):
+        """move overdue recurring reminders to their next time in the future, in one UPDATE ... FROM (VALUES ...)"""
+        now = datetime.datetime.now(datetime.UTC)
+        for reminder in reminders:
+            log.warning(f"reminder {reminder} is overdue, skipping to the next time")
+            reminder.next_remind = next_occurrence(reminder.next_remind, reminder.frequency, now)
+            reminder.leased_by = None
+            reminder.leased_until = None
+        new_times = values(
+            column('id', UUID(as_uuid=True)), column('next_remind', DateTime(True)), name='new_times'
+        ).data([(reminder.id, reminder.next_remind) for reminder in reminders])
+        async with db.async_session() as session:
+            async with session.begin():
+                await session.execute(
+                    update(Reminder)
+                    .where(Reminder.id == new_times.c.id)
+                    .values(next_remind=new_times.c.next_remind, leased_by=None, leased_until=None)
+                    .execution_options(synchronize_session=False)
+                )
+        for reminder in reminders:
+            self.schedule(reminder)
+
+    @Cog.listener()
+    async def on_row_change(self, change: db.RowChange):
+        if change.table == PendingClear.__tablename__:
+            await self.on_pending_clear_change(change)
+            return
+        if change.table != Reminder.__tablename__:
+            return
+        reminderId = uuid.UUID(change.key)
+        if change.op == 'DELETE':
+            self.unschedule(reminderId)
+            return
+        if reminderId in self.tasks:
+            return  # being sent right now, it'll reschedule itself when done
+        async with db.async_session() as session:
+            reminder = await session.get(Reminder, reminderId)
+        if reminder:
+            self.schedule(reminder)
+
+    @Cog.listener()
+    async def on_change_feed_connect(self):
+        await self.load_reminders()
+        await self.load_pending_clears()
+
+    def track_clear(self, pending: PendingClear):
+        self.clears[pending.messageId] = pending
+        self.clearsByChannel.setdefault(pending.channelId, set()).add(pending.messageId)
+        self.nags.add(pending.messageId, pending.next_nag)
+
+    def forget_clear(self, messageId: int):
+        pending = self.clears.pop(messageId, None)
+        self.nags.remove(messageId)
+        if pending and (waiting := self.clearsByChannel.get(pending.channelId)):
+            waiting.discard(messageId)
+            if not waiting:
+                del self.clearsByChannel[pending.channelId]
+
+    async def load_pending_clears(self):
+        async with db.async_session() as session:
+            pending = {pending.messageId: pending for pending in await session.scalars(select(PendingClear))}
+        for messageId in list(self.clears):
+            if messageId not in pending:
+                self.forget_clear(messageId)
+        for item in pending.values():
+            self.track_clear(item)
+
+    async def on_pending_clear_change(self, change: db.RowChange):
+        messageId = int(change.key)
+        if change.op == 'DELETE':
+            self.forget_clear(messageId)
+            return
+        async with db.async_session() as session:
+            pending = await session.get(PendingClear, messageId)
+        if pending:
+            self.track_clear(pending)
+
+    async def pending_clear_loop(self):
+        await self.load_pending_clears()
+        await self.bot.wait_until_ready()
+        while True:
+            for messageId in await self.nags.next_due():
+                if pending := self.clears.get(messageId):
+                    try:
+                        await self.nag(pending)
+                    except Exception as e:
+                        log.exception(e)
+                        # try again next interval, unless it was acked or re-tracked in the meantime
+                        if messageId in self.clears and messageId not in self.nags:
+                            self.nags.add(messageId, datetime.datetime.now(datetime.UTC) + NAG_INTERVAL)
+
+    async def nag(self, pending: PendingClear):
+        """repeat a require_clearing reminder that hasn't been acked yet"""
+        async with db.async_session() as session:
+            async with session.begin():
+                # only the process that bumps nags from the value we saw sends this nag
+                nagged = await session.scalar(
+                    update(PendingClear)
+                    .where(PendingClear.messageId == pending.messageId, PendingClear.nags == pending.nags)
+                    .values(nags=PendingClear.nags + 1, next_nag=func.now() + NAG_INTERVAL)
+                    .returning(PendingClear)
+                    .execution_options(synchronize_session=False)
                 )
-                reminders = await session.scalars(stmt)
-                for reminder in reminders:
-                    if reminder.id not in self.tasks:
-                        self.tasks[reminder.id] = self.bot.loop.create_task(self.remind(reminder))
-            await asyncio.sleep(60)
+        if not nagged:
+            return  # acked, or nagged by someone else. the change feed will catch us up
+        message = self.bot.get_partial_messageable(nagged.channelId).get_partial_message(nagged.messageId)
+        try:
+            await message.reply("reminder!")
+        except discord.NotFound:
+            log.warning(f"pending clear {nagged.messageId} is gone, dropping it")
+            await self.clear_pending([nagged.messageId])
+            return
+        if nagged.nags >= MAX_NAGS:
+            await self.clear_pending([nagged.messageId])
+        else:
+            self.track_clear(nagged)
+
+    async def clear_pending(self, messageIds: List[int]) -> List[PendingClear]:
+        """stop nagging for these messages. returns the ones that were still pending"""
+        async with db.async_session() as session:
+            async with session.begin():
+                cleared = list(
+                    await session.scalars(
+                        delete(PendingClear).where(PendingClear.messageId.in_(messageIds)).returning(PendingClear)
+                    )
+                )
+        for messageId in messageIds:
+            self.forget_clear(messageId)
+        return cleared
+
+    @Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # one dict lookup for every message that isn't in a channel with a reminder waiting for an ack
+        waiting = self.clearsByChannel.get(message.channel.id)
+        if not waiting or not message.content.lower().startswith('ack'):
+            return
+        cleared = await self.clear_pending(list(waiting))
+        if not cleared:
+            return
+        await message.reply("reminder cleared")
+        for pending in cleared:
+            await message.channel.get_partial_message(pending.messageId).edit(
+                view=ClearReminderView(self, cleared=True)
+            )
 
     async def remind(self, reminder: Reminder):
         await self.bot.wait_until_ready()
+        done = False
         try:
-            if await self._wait_for_reminder(reminder):
-                return
+            if self._is_overdue(reminder):
+                log.warning(f"reminder {reminder} is overdue")
+                # modify the remidner message in memory to show it's overdue
+                reminder.message = f"**OVERDUE** {reminder.message}"
             allowedMentions = discord.AllowedMentions.none()
             log.debug(f"reminding {reminder}")
             try:
@@ -74,8 +357,8 @@ class Reminders(Cog):
             except discord.NotFound:
                 target = None
 
-            owner = await self._handle_no_target(reminder, target)
-            if not owner:
+            if not target:
+                await self._handle_no_target(reminder)
                 return
 
             message = reminder.message
@@ -106,29 +389,44 @@ class Reminders(Cog):
                 if owner and target.permissions_for(owner).mention_everyone:
                     allowedMentions.everyone = True
 
+            DELIVERY_LAG.observe((datetime.datetime.now(datetime.UTC) - reminder.next_remind).total_seconds())
             await self._handle_clearing(reminder, allowedMentions, target, message)
 
-            if self._handle_reminder(self, reminder):
-                return
-
-            # remove task from tasks dict
+            await self._handle_reminder(reminder)
+            done = True
+        except Exception as e:
+            log.exception(e)
         finally:
+            # remove task from tasks dict
             del self.tasks[reminder.id]
+        if not done:
+            await self.retry_later(reminder)
+
+    async def retry_later(self, reminder: Reminder):
+        """
+        queue a reminder that couldn't be sent again. it's still leased to us, so it comes back once the lease ends.
+        by then a recurring reminder is overdue, and skips to its next time instead.
+        """
+        try:
+            async with db.async_session() as session:
+                current = await session.get(Reminder, reminder.id)
+        except Exception as e:
+            log.exception(e)
+            # claim reads the row again anyway, this only needs the id and our lease
+            current = reminder
+        if current is None:
+            return  # deleted meanwhile
+        log.warning(f"reminder {current} was not sent, retrying at {current.leased_until}")
+        self.schedule(current)
+
+    async def _handle_no_target(self, reminder):
+        log.error(f"Could not find target {reminder.target} for reminder {reminder}")
+        # try to message the owner about it:
+        owner = self.bot.get_user(reminder.owner)
+        if not owner:
+            log.error(f"Could not find owner {reminder.owner} for reminder {reminder}")
             return
-
-    async def _handle_no_target(self, reminder, target):
-        owner = None
-        if not target:
-            log.error(f"Could not find target {reminder.target} for reminder {reminder}")
-            # try to message the owner about it:
-            owner = self.bot.get_user(reminder.owner)
-            if not owner:
-                log.error(f"Could not find owner {reminder.owner} for reminder {reminder}")
-                return None
-            await owner.send(f"Could not find target channel {reminder.target} for reminder {reminder.message}")
-            return owner
-
-        return owner
+        await owner.send(f"Could not find target channel {reminder.target} for reminder {reminder.message}")
 
     async def _handle_clearing(self, reminder, allowedMentions, target, message):
         if reminder.require_clearing:
@@ -140,90 +438,54 @@ class Reminders(Cog):
                 await msg.add_reaction("<:greentick:1255344157761867816>")
 
     async def _handle_reminder(self, reminder):
-
-        should_exit = False
         if reminder.frequency:
             # reschedule the reminder for later
             async with db.async_session() as session:
                 async with session.begin():
-                    edited = await session.scalar(select(Reminder).where(Reminder.id == reminder.id))
-                    if not edited:
-                        log.error(f"reminder {reminder} not found in database")
-                        return True
-                    edited.next_remind = (
-                        edited.next_remind + reminder.frequency
-                    )  # prevent drift by adding the frequency
-                    session.add(edited)
-                    await session.commit()
+                    edited = await session.scalar(
+                        update(Reminder)
+                        .where(Reminder.id == reminder.id)
+                        .values(
+                            # prevent drift by adding the frequency
+                            next_remind=Reminder.next_remind + reminder.frequency,
+                            leased_by=None,
+                            leased_until=None,
+                        )
+                        .returning(Reminder)
+                        .execution_options(synchronize_session=False)
+                    )
+            if not edited:
+                log.error(f"reminder {reminder} not found in database")
+                return
+            self.schedule(edited)
         else:
             # delete the reminder
             async with db.async_session() as session:
                 async with session.begin():
-                    delete = await session.scalar(select(Reminder).where(Reminder.id == reminder.id))
-                    await session.delete(delete)
-                    await session.commit()
-
-        return should_exit
+                    await session.execute(delete(Reminder).where(Reminder.id == reminder.id))
 
     async def _reminder_clearing(self, reminder, allowedMentions, target, message):
-        v = ClearReminderView()
-        dis_message = await target.send(message, view=v, allowed_mentions=allowedMentions)
+        dis_message = await target.send(message, view=self.clear_view, allowed_mentions=allowedMentions)
         if reminder.auto_react:
             await dis_message.add_reaction("<:greentick:1255344157761867816>")
-        while v.waiting and v.times < 8:  # 8 * 5 minutes = 40 minutes
-            msg = None
-            try:
-                msg = await self.bot.wait_for(
-                    "message",
-                    check=lambda m: m.channel.id == target.id and m.content.lower().startswith('ack'),
-                    timeout=300,
-                )
-                v.waiting = False
-                v.children[0].disabled = True
-                await msg.reply("reminder cleared")
-                await dis_message.edit(view=v)
-            except asyncio.TimeoutError:
-                pass
-            if v.waiting:
-                v.times += 1
-                await dis_message.reply("reminder!")
+        pending = PendingClear(
+            messageId=dis_message.id,
+            channelId=dis_message.channel.id,
+            next_nag=datetime.datetime.now(datetime.UTC) + NAG_INTERVAL,
+        )
+        async with db.async_session() as session:
+            async with session.begin():
+                session.add(pending)
+        self.track_clear(pending)
 
     remindersGroup = app_commands.Group(
         name="reminders",
         description="menu for working with reminders",
     )
 
-    async def _wait_for_reminder(self, reminder):
-
-        should_exit = False
-
-        # wait for the reminder time
-        now = datetime.datetime.now(datetime.UTC)
-        if now > reminder.next_remind:
-            log.warning(f"reminder {reminder} is overdue")
-            if reminder.frequency:
-                # ok, we should skip the missed recurres, and just do the next one
-                while now > reminder.next_remind:
-                    reminder.next_remind = reminder.next_remind + reminder.frequency
-
-                async with db.async_session() as session:
-                    async with session.begin():
-                        edited = await session.scalar(select(Reminder).where(Reminder.id == reminder.id))
-                        if not edited:
-                            log.error(f"reminder {reminder} not found in database")
-                            should_exit = True
-                        else:
-                            edited.next_remind = reminder.next_remind
-                            session.add(edited)
-                            await session.commit()
-                            should_exit = True
-            else:
-                # modify the remidner message in memory to show it's overdue
-                reminder.message = f"**OVERDUE** {reminder.message}"
-        else:
-            await asyncio.sleep((reminder.next_remind - now).total_seconds())
-
-        return should_exit
+    @staticmethod
+    def _is_overdue(reminder: Reminder) -> bool:
+        return datetime.datetime.now(datetime.UTC) - reminder.next_remind > OVERDUE_GRACE
 
     @remindersGroup.command(name="add", description="add a new reminder")
     @app_commands.describe(
@@ -293,6 +555,7 @@ class Reminders(Cog):
                 )
                 session.add(reminder)
                 await session.commit()
+        self.schedule(reminder)
 
         await interaction.response.send_message(
             f"Reminder created with id `{reminder.id}`, at time {discord.utils.format_dt(reminder.next_remind)}",
@@ -327,13 +590,7 @@ class Reminders(Cog):
         else:
             # validate the time field and return the time, if we have the user's timezone, otherwise UTC time
             try:
-                uc = None
-                async with db.async_session() as session:
-                    uc = await session.scalar(select(UserConfig).where(UserConfig.userId == interaction.user.id))
-                if not uc:
-                    uc = UserConfig(interaction.user.id)
-                    session.add(uc)
-                    await session.commit()
+                uc = await self.bot.userConfigs.get_or_create(interaction.user.id)
                 tz = pytz.timezone(uc.timeZone)
                 td = resolve_duration(time)
                 dt = datetime.datetime.now(tz) + td
@@ -359,6 +616,7 @@ class Reminders(Cog):
                 )
             await session.delete(reminder)
             await session.commit()
+        self.unschedule(reminder.id)
         await interaction.response.send_message(f"Reminder with messasge `{reminder.message}` deleted", ephemeral=True)
 
     @time_cache(60)
@@ -371,48 +629,67 @@ class Reminders(Cog):
 
     @remove_reminder.autocomplete('id')
     async def autocomplete_remove(self, interaction: discord.Interaction, msg: str):
-        async with db.async_session() as session:
-            if interaction.guild and interaction.user.guild_permissions.manage_guild:
-                stmt = select(Reminder).where(
-                    or_(Reminder.guildId == interaction.guild.id, Reminder.owner == interaction.user.id)
-                )
-            else:
-                stmt = select(Reminder).where(Reminder.owner == interaction.user.id)
+        if interaction.guild and interaction.user.guild_permissions.manage_guild:
+            stmt = select(Reminder).where(
+                or_(Reminder.guildId == interaction.guild.id, Reminder.owner == interaction.user.id)
+            )
+        else:
+            stmt = select(Reminder).where(Reminder.owner == interaction.user.id)
+        if msg:
+            # matched in the database, with the trigram index on message
+            escaped = msg.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            stmt = stmt.where(Reminder.message.ilike(f"%{escaped}%", escape='\\'))
+        stmt = stmt.order_by(Reminder.next_remind).limit(AUTOCOMPLETE_LIMIT)
 
+        async with db.async_session() as session:
             reminders = await session.scalars(stmt)
-        reminders = [reminder for reminder in reminders if msg.lower() in reminder.message.lower()]
         return [
             discord.app_commands.Choice(
                 name=f"{reminder.message[:25]}{'...' if len(reminder.message)>26 else ''}, at {reminder.next_remind}",
                 value=str(reminder.id),
             )
             for reminder in reminders
-            if msg.lower() in reminder.message.lower()
         ]
 
+    async def iter_reminders(self, *where) -> AsyncIterator[Reminder]:
+        """yields the reminders matching `where` by next_remind, fetching LIST_PAGE_SIZE rows at a time"""
+        last: Optional[Reminder] = None
+        while True:
+            stmt = select(Reminder).where(*where).order_by(Reminder.next_remind, Reminder.id).limit(LIST_PAGE_SIZE)
+            if last:
+                # keyset pagination, picks up after the last row instead of OFFSET-ing over everything before it
+                stmt = stmt.where(tuple_(Reminder.next_remind, Reminder.id) > tuple_(last.next_remind, last.id))
+            async with db.async_session() as session:
+                reminders = (await session.scalars(stmt)).all()
+            for reminder in reminders:
+                yield reminder
+            if len(reminders) < LIST_PAGE_SIZE:
+                return
+            last = reminders[-1]
+
     @remindersGroup.command(name="list", description="list reminders")
     async def list_reminders(self, interaction: discord.Interaction):
-        async with db.async_session() as session:
-            # are we in a guild, or dms? if we're in a guild, only show that guild's reminders. if we're in dms, show all reminders
-            if interaction.guild:
-                stmt = select(Reminder).where(Reminder.guildId == interaction.guild.id)
-                fmt = "{reminder.next_remind} every {reminder.frequency} by {owner}: `{reminder.message}`"
-            else:
-                # we must be in dms, get reminders with no guild and the owner is the user
-                stmt = select(Reminder).where(and_(Reminder.guildId == None, Reminder.owner == interaction.user.id))
-                fmt = "{reminder.next_remind} every {reminder.frequency}: `{reminder.message}`"
-
-            reminders = (await session.scalars(stmt)).all()
-            if len(reminders) == 0:
-                return await interaction.response.send_message("No reminders found", ephemeral=True)
-
-            paginator = Paginator(prefix="```", suffix="```", max_size=500)
-            for reminder in reminders:
-                paginator.add_line(fmt.format(reminder=reminder, owner=self.bot.get_user(reminder.owner)))
-            pi = InteractionPaginator(self.bot, paginator, owner=None)
-            await pi.send_interaction(interaction)
-        if not reminders:
+        # are we in a guild, or dms? if we're in a guild, only show that guild's reminders. if we're in dms, show all reminders
+        if interaction.guild:
+            reminders = self.iter_reminders(Reminder.guildId == interaction.guild.id)
+            fmt = "{reminder.next_remind} every {reminder.frequency} by {owner}: `{reminder.message}`"
+        else:
+            # we must be in dms, get reminders with no guild and the owner is the user
+            reminders = self.iter_reminders(Reminder.guildId == None, Reminder.owner == interaction.user.id)
+            fmt = "{reminder.next_remind} every {reminder.frequency}: `{reminder.message}`"
+        lines = (fmt.format(reminder=reminder, owner=self.bot.get_user(reminder.owner)) async for reminder in reminders)
+
+        paginator = Paginator(prefix="```", suffix="```", max_size=500)
+        pi = InteractionPaginator(self.bot, paginator, owner=None)
+        # fill the first couple of pages, the rest are fetched as the user pages through
+        async for line in lines:
+            paginator.add_line(line)
+            if pi.page_count > 2:
+                break
+        if pi.page_count == 0:
             return await interaction.response.send_message("No reminders found", ephemeral=True)
+        await pi.send_interaction(interaction)
+        self.bot.loop.create_task(pi.feed(lines))
 
 
 async def setup(bot):
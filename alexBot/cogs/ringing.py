@@ -3,9 +3,7 @@ from typing import Dict
 
 import discord
 from discord import app_commands
-from sqlalchemy import select
 
-from alexBot import database as db
 from alexBot.classes import RingRate
 from alexBot.tools import Cog
 
@@ -45,36 +43,27 @@ class Ringing(Cog):
         if target.voice:
             await interaction.response.send_message("cannot ring: they are already in voice", ephemeral=True)
             return
-        uc = None
-        async with db.async_session() as session:
-            uc = await session.scalar(select(db.UserConfig).where(db.UserConfig.userId == interaction.user.id))
-            if not uc:
-                # create one
-                uc = db.UserConfig(userId=interaction.user.id)
-                session.add(uc)
-                await session.commit()
-
-            if not uc.ringable:
-                await interaction.response.send_message("cannot ring: they do not want to be rung", ephemeral=True)
-                return
-
-            ringRate = RING_RATES[target.status]
-            task = asyncio.create_task(self.doRing(interaction.user, target, interaction.channel, ringRate))
-            msg = (
-                "ringing..."
-                if uc.hasBeenRung
-                else "ringing... use `/config user set ringable false` to disallow this feature"
-            )
-            await interaction.response.send_message(msg, view=self.CancelableTaskView(task))
-            if not uc.hasBeenRung:
-                uc.hasBeenRung = True
-                session.add(uc)
-                await session.commit()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
-            await (await interaction.original_response()).edit(view=None)
+        uc = await self.bot.userConfigs.get_or_create(interaction.user.id)
+
+        if not uc.ringable:
+            await interaction.response.send_message("cannot ring: they do not want to be rung", ephemeral=True)
+            return
+
+        ringRate = RING_RATES[target.status]
+        task = asyncio.create_task(self.doRing(interaction.user, target, interaction.channel, ringRate))
+        msg = (
+            "ringing..."
+            if uc.hasBeenRung
+            else "ringing... use `/config user set ringable false` to disallow this feature"
+        )
+        await interaction.response.send_message(msg, view=self.CancelableTaskView(task))
+        if not uc.hasBeenRung:
+            await self.bot.userConfigs.update(interaction.user.id, hasBeenRung=True)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await (await interaction.original_response()).edit(view=None)
 
     async def doRing(
         self,
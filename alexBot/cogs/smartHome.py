@@ -1,4 +1,5 @@
 import asyncio
+import copy
 import json
 import logging
 import typing
@@ -11,6 +12,7 @@ import discord
 from aiomqtt.types import PayloadType
 from discord.ext import tasks
 
+from alexBot.classes import VoiceEvent
 
 from ..tools import Cog, get_json, render_voiceState
 
@@ -183,11 +185,12 @@ class PhoneMonitor(Cog):
         await mqtt.mqttPublish(f"homeassistant/sensor/alexBot/{member.id}-voice-state/config", json.dumps(payload))
 
     @Cog.listener()
-    async def on_voice_state_update(
-        self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState
-    ):
-        channel: discord.VoiceChannel = before.channel or after.channel  # type: ignore
-        if before.channel and after.channel and before.channel == after.channel:
+    async def on_voice_event(self, event: VoiceEvent):
+        # after is copied because the loop below hides channels from users who can't see them by editing it,
+        # and the event is shared with the other cogs
+        member, before, after = event.member, event.before, copy.copy(event.after)
+        channel = event.channel
+        if event.stateChange:
             log.debug(f"no one moved in {channel.name}")
             # no one moved, check if user acted on is notifiable
             if member.id in self.notifiable:
@@ -12,6 +12,7 @@ from discord import app_commands
 from discord.ext import commands
 from discord.member import VoiceState
 
+from ..database import CHECKOUT_WAIT, QUERY_TIME, engine
 from ..tools import Cog
 
 DATEFORMAT = "%a, %e %b %Y %H:%M:%S (%-I:%M %p)"
@@ -130,6 +131,29 @@ class Utils(Cog):
 
         await ctx.send(embed=ret)
 
+    @commands.command(name='dbstats')
+    @commands.is_owner()
+    async def dbstats(self, ctx: commands.Context):
+        """database pool status, and the statements that spent the most time in the database"""
+        pool = engine.pool
+        wait = CHECKOUT_WAIT
+        lines = [
+            f"pool: {pool.checkedout()} checked out, {pool.checkedin()} idle, "
+            f"size {pool.size()}, overflow {pool.overflow()}",
+            f"checkout wait: {wait.count()} checkouts, "
+            f"p50 {wait.quantile(0.5) * 1000:g}ms, p95 {wait.quantile(0.95) * 1000:g}ms",
+            "",
+        ]
+        slowest = sorted(QUERY_TIME.series, key=QUERY_TIME.total, reverse=True)[:10]
+        for statement in slowest:
+            p50 = QUERY_TIME.quantile(0.5, statement) * 1000
+            p95 = QUERY_TIME.quantile(0.95, statement) * 1000
+            lines.append(
+                f"{QUERY_TIME.total(statement):8.2f}s {QUERY_TIME.count(statement):6}x "
+                f"p50 {p50:g}ms p95 {p95:g}ms {statement[:80]}"
+            )
+        await ctx.send("```\n" + "\n".join(lines)[:1980] + "\n```")
+
     @commands.command()
     async def invite(self, ctx):
         """tells you my invite link!"""
@@ -1,29 +1,29 @@
 import asyncio
+import datetime
 from collections import namedtuple
-from dataclasses import dataclass
 import io
 import itertools
 import logging
-import math
 import os
+import random
 import re
-import subprocess
-import traceback
-from functools import partial
-from typing import List, Optional, Tuple
+import tempfile
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import aiohttp
 import discord
 from discord.errors import DiscordException
-from discord.ext import commands
 from discord import app_commands
 from slugify import slugify
-from sqlalchemy import select
 
-from alexBot import database as db
+from alexBot import metrics
+from alexBot.caches import DiskLRUCache
 from alexBot.cobalt import Cobalt, RequestBody
+from alexBot.scheduler import FairScheduler, RateLimited
+from alexBot.transcode import TranscodeService
 
-from ..tools import Cog, timing
+from ..tools import Cog
 
 from mimetypes import guess_extension
 
@@ -42,12 +42,38 @@ DOMAINS = [
     "reddit.com",
 ]
 
-MAX_VIDEO_LENGTH = 5 * 60  # 5 Minutes
-AUDIO_BITRATE = 64 * 1000  # 64 Kbits
-BUFFER_CONSTANT = 20  # Magic number, see https://unix.stackexchange.com/a/598360
-
-FFPROBE_CMD = 'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 in.mp4'
-FFMPEG_CMD = 'ffmpeg -i in.mp4 -y -b:v {0} -maxrate:v {0} -b:a {1} -maxrate:a {1} -bufsize:v {2} out.mp4'
+# every link to one of DOMAINS (or a subdomain of one), found in one pass. host is the whole host name, so per site
+# rules can be applied. links end at whitespace, or the > or ) closing a <link> or a markdown [text](link)
+LINK_REGEX = re.compile(
+    r'https?://(?P<host>(?:[^\s/<>]+\.)?(?:' + '|'.join(re.escape(domain) for domain in DOMAINS) + r'))/[^\s<>)]*'
+)
+# youtube links are only mirrored for shorts and clips, full videos are too long
+YOUTUBE_DOMAINS = ("youtube.com", "youtu.be")
+
+
+def find_video_links(content: str) -> List[str]:
+    """every link in `content` that should be mirrored, in the order they appear"""
+    links = []
+    for match in LINK_REGEX.finditer(content):
+        link = match.group(0)
+        if match.group('host').endswith(YOUTUBE_DOMAINS) and 'shorts' not in link and 'clip' not in link:
+            continue
+        links.append(link)
+    return links
+
+
+# downloads are spooled to disk in chunks of this size, and abandoned once they pass MAX_DOWNLOAD_SIZE
+CHUNK_SIZE = 64 * 1024
+MAX_DOWNLOAD_SIZE = 256 * 1024 * 1024  # 256 MiB
+# picker items are fetched at most this many at a time from each host, retried with backoff starting at
+# PICKER_BACKOFF seconds, and streamed to disk when they're bigger than PICKER_MEMORY_LIMIT
+PICKER_HOST_CONCURRENCY = 4
+PICKER_ATTEMPTS = 4
+PICKER_BACKOFF = 0.5
+PICKER_MEMORY_LIMIT = 1024 * 1024
+
+# interaction tokens are good for 15 minutes, leave a little room to send the error
+INTERACTION_DEADLINE = datetime.timedelta(minutes=14)
 
 # fake headers for firefox
 FAKE_HEADERS = {
@@ -66,23 +92,71 @@ FAKE_HEADERS = {
 }
 
 
+# query parameters that only track who shared a link, or where a video starts. anything else may pick what is being
+# linked (facebook's story_fbid and id, youtube's v), so it's kept
+DROPPED_QUERY_PARAMS = {"fbclid", "si", "igsh", "igshid", "feature", "t", "s"}
+DROPPED_QUERY_PREFIXES = ("utm_",)
+# hosts that serve the same links under another name
+HOST_ALIASES = {"x.com": "twitter.com", "youtu.be": "youtube.com"}
+
+
+def canonical_url(url: str) -> str:
+    """
+    normalize a link so that different ways of writing the same post compare equal: no tracking parameters,
+    no mobile / www subdomains, and youtu.be and youtube shorts links rewritten to watch?v= links
+    """
+    parts = urlsplit(url.strip())
+    host = parts.hostname or ""
+    for prefix in ("www.", "m.", "mobile."):
+        host = host.removeprefix(prefix)
+    host = HOST_ALIASES.get(host, host)
+    path = parts.path.rstrip("/")
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query)
+        if key not in DROPPED_QUERY_PARAMS and not key.startswith(DROPPED_QUERY_PREFIXES)
+    ]
+    if parts.hostname and parts.hostname.endswith("youtu.be"):
+        query, path = [("v", path.lstrip("/"))], "/watch"
+    elif host == "youtube.com" and path.startswith("/shorts/"):
+        query, path = [("v", path.removeprefix("/shorts/"))], "/watch"
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def mirror_key(url: str, size_limit: int) -> str:
+    """what a mirror of `url` is cached and deduplicated under. the size limit decides how it's encoded"""
+    return f"{canonical_url(url)} {size_limit}"
+
+
 #  -loglevel 8
 class NotAVideo(Exception):
     pass
 
 
-@dataclass
-class ImageAndExtension:
-    image: bytes
-    extension: str
+class VideoTooLarge(Exception):
+    pass
 
 
 class Video_DL(Cog):
 
     def __init__(self, bot):
-        self.encode_lock = asyncio.Lock()
+        self.transcoder = TranscodeService(bot.config.transcode_workers, bot.config.transcode_queue_size)
+        self.mirrorCache = DiskLRUCache(bot.config.mirror_cache_dir, bot.config.mirror_cache_size)
+        metrics.register_cache("mirror", self.mirrorCache)
+        metrics.register(
+            metrics.Gauge(
+                "alexbot_mirror_cache_bytes", "size of the mirror cache on disk", lambda: self.mirrorCache.size
+            )
+        )
         self.mirror_upload_lock = asyncio.Lock()
-        self._cobalt: Optional[Cobalt] = None
+        self.cobalt = Cobalt()
+        self.pickerHostLimits: Dict[str, asyncio.Semaphore] = {}
+        self.scheduler = FairScheduler(
+            "mirror",
+            bot.config.mirror_concurrency,
+            guildRate=(bot.config.mirror_guild_per_minute / 60, bot.config.mirror_guild_burst),
+            userRate=(bot.config.mirror_user_per_minute / 60, bot.config.mirror_user_burst),
+        )
         super().__init__(bot)
 
         self.videoDLRequestMenu = app_commands.ContextMenu(
@@ -98,6 +172,7 @@ class Video_DL(Cog):
         ]
         for command in commands:
             self.bot.tree.add_command(command)
+        self.cobalt.start()
 
     async def cog_unload(self) -> None:
         commands = [
@@ -105,108 +180,165 @@ class Video_DL(Cog):
         ]
         for command in commands:
             self.bot.tree.remove_command(command.name, type=command.type)
+        await self.cobalt.close()
 
     async def video_download_request(self, interaction: discord.Interaction, message: discord.Message):
         # check for a valid video
-        match = None
-        for domain in DOMAINS:
-            log.debug(f"Searching for domain: {domain} in message content")
-            if match := re.search(rf'(https?://[^ ]*{domain}/[^ \n]*)', message.content):
-                if domain in ["youtube.com", "youtu.be"]:
-                    if 'shorts' in match.group(1) or 'clip' in match.group(1):
-                        log.debug("Match found for youtube SHORTS / CLIPS domain. Breaking loop.")
-                        break
-                else:
-                    log.debug(f"Match found for domain: {domain}. Breaking loop.")
-                    break
-        if not match:
+        links = find_video_links(message.content)
+        if not links:
             return await interaction.response.send_message("No video found in message content.", ephemeral=True)
 
+        size_limit = interaction.guild.filesize_limit if interaction.guild else 8_000_000
+        guildId = interaction.guild.id if interaction.guild else None
         await interaction.response.defer(ephemeral=False)
+        # whether the deferred response is showing the queue / encode status, and has to be cleaned up
+        showingStatus = False
+
+        async def on_position(position: int):
+            nonlocal showingStatus
+            showingStatus = True
+            await interaction.edit_original_response(content=f"Waiting to encode, {position} in line...")
+
+        async def on_progress(progress: float):
+            nonlocal showingStatus
+            showingStatus = True
+            await interaction.edit_original_response(content=f"Encoding... {progress:.0%}")
+
+        # give up (and stop encoding) before the interaction expires, nobody would see the result
+        remaining = interaction.created_at + INTERACTION_DEADLINE - discord.utils.utcnow()
         try:
-            attachmentss = await self.download_video(
-                match.group(1), interaction.guild.filesize_limit if interaction.guild else 8_000_000
-            )
+            async with (
+                asyncio.timeout(remaining.total_seconds()),
+                self.scheduler.job(guildId, interaction.user.id, mirror_key(links[0], size_limit)),
+            ):
+                async for attachments in self.download_video(
+                    links[0], size_limit, on_position=on_position, on_progress=on_progress
+                ):
+                    if showingStatus:
+                        await interaction.delete_original_response()
+                        showingStatus = False
+                    await interaction.followup.send(files=attachments)
+        except RateLimited as e:
+            await interaction.delete_original_response()
+            return await interaction.followup.send(content=str(e), ephemeral=True)
+        except TimeoutError:
+            return await interaction.followup.send(content="Error: timed out processing the video", ephemeral=True)
         except Exception as e:
-            log.error("Error processing video from direct interaction", e)
-            await interaction.followup.send(content=f"Error: {e}", ephemeral=True)
-        for attachments in attachmentss:
-            await interaction.followup.send(files=attachments)
-
-    @staticmethod
-    async def fetch_image(url: str, session: aiohttp.ClientSession, count=0) -> ImageAndExtension:
-        if count > 3:
-            raise Exception("Too many retries fetching image")
-        async with session.get(url) as response:
-            if not response.ok:
-                await asyncio.sleep(1)
-                return await Video_DL.fetch_image(url, session, count + 1)
-            if not response.content_type:
-                raise Exception("No content type found")
-            return ImageAndExtension(await response.read(), guess_extension(response.content_type) or 'jpg')
-
-    async def get_cobalt_instace(self) -> Cobalt:
-        if self._cobalt:
-            return self._cobalt
-        self._cobalt = Cobalt()
-
-        async def test_cobalt():
-            while self._cobalt:
-                await asyncio.sleep(60 * 15)
-                try:
-                    await self._cobalt.get_server_info()
-                except Exception as e:
-                    log.error("Error testing cobalt", e)
-                    self._cobalt = None
-
-        self.bot.loop.create_task(test_cobalt())
-        return self._cobalt
-
-    async def download_video(self, url: str, size_limit: int) -> List[List[discord.File]]:
-        cobalt = await self.get_cobalt_instace()
+            log.exception("Error processing video from direct interaction")
+            return await interaction.followup.send(content=f"Error: {e}", ephemeral=True)
+
+    async def fetch_image(self, url: str, index: int, workdir: str) -> discord.File:
+        """
+        download one picker item, at most PICKER_HOST_CONCURRENCY at a time per host. server errors, 429s and
+        connection errors are retried with backoff.
+        small items are kept in memory, anything bigger (or of unknown size) is streamed to `workdir`
+        """
+        host = urlsplit(url).hostname or ""
+        limit = self.pickerHostLimits.setdefault(host, asyncio.Semaphore(PICKER_HOST_CONCURRENCY))
+        for attempt in range(PICKER_ATTEMPTS):
+            try:
+                async with limit, self.cobalt.session.get(url) as response:
+                    response.raise_for_status()
+                    if not response.content_type:
+                        raise Exception("No content type found")
+                    filename = f"{index}{guess_extension(response.content_type) or '.jpg'}"
+                    if response.content_length and response.content_length <= PICKER_MEMORY_LIMIT:
+                        return discord.File(io.BytesIO(await response.read()), filename)
+                    path = os.path.join(workdir, filename)
+                    await self.spool_to_file(response, path)
+                    return discord.File(open(path, "rb"), filename)
+            except aiohttp.ClientResponseError as e:
+                # only worth retrying when the host is struggling. a 404 will still be a 404 next time
+                if (e.status < 500 and e.status != 429) or attempt + 1 == PICKER_ATTEMPTS:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt + 1 == PICKER_ATTEMPTS:
+                    raise
+            # exponential backoff, with full jitter so a gallery's retries don't all land at once
+            await asyncio.sleep(random.uniform(0, PICKER_BACKOFF * 2**attempt))
+
+    async def download_video(
+        self,
+        url: str,
+        size_limit: int,
+        on_position: Optional[Callable[[int], Awaitable[None]]] = None,
+        on_progress: Optional[Callable[[float], Awaitable[None]]] = None,
+    ) -> AsyncIterator[List[discord.File]]:
+        """
+        yields the files to upload for `url`, in batches of up to 10 (the most discord takes per message).
+        `on_position` and `on_progress` are passed on to the transcoder, if the video has to be encoded
+        """
+        cacheKey = mirror_key(url, size_limit)
+        if cached := self.mirrorCache.get(cacheKey):
+            log.debug(f"serving {url} from the mirror cache")
+            yield [discord.File(open(cached, "rb"), os.path.basename(cached))]
+            return
         rq = RequestBody(url=url, alwaysProxy=True)
-        res = await cobalt.process(rq)
-        async with aiohttp.ClientSession(headers=cobalt.headers) as session:
-            match res.status:
-                case "tunnel" | "redirect":
-                    # download the stream to reupload to discord
-                    log.debug("Status is stream or tunnel. Downloading the stream.")
-                    async with session.get(res.url) as response:
-                        stuff = await response.read()
-                        if not response.content_disposition:
-                            raise NotAVideo("No content disposition found.")
-                        bytes = io.BytesIO(stuff)
-                        if len(bytes.getvalue()) > size_limit:
-                            async with self.encode_lock:
-                                task = partial(self.transcode_shrink, bytes, size_limit)
-                                bytes = await self.bot.loop.run_in_executor(None, task)
-
-                        filename = response.content_disposition.filename
-                        if not filename:
-                            words = response.url.path.split("/")[-1]
-                            words += "." + (guess_extension(response.content_type) or "mp4")
-                            filename = words
-
-                        return [[discord.File(bytes, filename)]]
-
-                case "picker":
-                    # gotta download the photos to post, batch by 10's
-                    log.debug("Status is picker. Downloading the photos.")
-                    if not res.picker:
-                        raise NotAVideo("No pickers found.")
-                    images = await asyncio.gather(*[self.fetch_image(each.url, session) for each in res.picker])
-
-                    return [
-                        [
-                            discord.File(io.BytesIO(image.image), f"{n+(m*10)}.{image.extension}")
-                            for n, image in enumerate(group)
-                        ]
-                        for m, group in enumerate(itertools.batched(images, 10))
+        res = await self.cobalt.process(rq)
+        match res.status:
+            case "tunnel" | "redirect":
+                # stream the video to disk to reupload to discord
+                log.debug("Status is stream or tunnel. Downloading the stream.")
+                async with self.cobalt.session.get(res.url) as response:
+                    if not response.content_disposition:
+                        raise NotAVideo("No content disposition found.")
+                    filename = response.content_disposition.filename
+                    if not filename:
+                        words = response.url.path.split("/")[-1]
+                        words += "." + (guess_extension(response.content_type) or "mp4")
+                        filename = words
+
+                    with self.mirrorCache.tempdir() as workdir:
+                        path = os.path.join(workdir, "in.mp4")
+                        size = await self.spool_to_file(response, path)
+                        if size > size_limit:
+                            path = await self.transcoder.transcode(
+                                path, os.path.join(workdir, "out.mp4"), size_limit, on_position, on_progress
+                            )
+                        path = self.mirrorCache.put(cacheKey, path, filename)
+                        # the open handle keeps the file readable even if it's evicted,
+                        # and discord.py streams the upload from it and closes it once sent
+                        yield [discord.File(open(path, "rb"), filename)]
+
+            case "picker":
+                # gotta download the photos to post, batch by 10's
+                log.debug("Status is picker. Downloading the photos.")
+                if not res.picker:
+                    raise NotAVideo("No pickers found.")
+                with tempfile.TemporaryDirectory(prefix="alexbot-picker-", ignore_cleanup_errors=True) as workdir:
+                    # everything downloads at once (within the per host limits), and each batch of 10
+                    # is handed out as soon as it's complete, while the rest keep downloading
+                    tasks = [
+                        asyncio.create_task(self.fetch_image(each.url, n, workdir)) for n, each in enumerate(res.picker)
                     ]
+                    try:
+                        for batch in itertools.batched(tasks, 10):
+                            yield list(await asyncio.gather(*batch))
+                    finally:
+                        # close the files of images that were fetched but never sent. closing a sent one again is fine
+                        for task in tasks:
+                            if not task.done():
+                                task.cancel()
+                            elif not task.cancelled() and task.exception() is None:
+                                task.result().close()
+
+            case "error":
+                log.error(f"Error in cobalt with url {rq.url}: {res.error}")
+                raise Exception(f"Error in cobalt with url {rq.url}: {res.error}")
 
-                case "error":
-                    log.error(f"Error in cobalt with url {rq.url}: {res.error}")
-                    raise Exception(f"Error in cobalt with url {rq.url}: {res.error}")
+    @staticmethod
+    async def spool_to_file(response: aiohttp.ClientResponse, path: str) -> int:
+        """write a response body to `path` a chunk at a time, giving up past MAX_DOWNLOAD_SIZE. returns the size"""
+        if response.content_length and response.content_length > MAX_DOWNLOAD_SIZE:
+            raise VideoTooLarge(f"Video is {response.content_length} bytes, over the {MAX_DOWNLOAD_SIZE} byte limit.")
+        size = 0
+        with open(path, "wb") as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_DOWNLOAD_SIZE:
+                    raise VideoTooLarge(f"Video is over the {MAX_DOWNLOAD_SIZE} byte limit.")
+                f.write(chunk)
+        return size
 
     @Cog.listener()
     async def on_message(self, message: discord.Message, interaction: Optional[discord.Interaction] = None):
@@ -214,55 +346,41 @@ class Video_DL(Cog):
         if message.guild is None:
             log.debug("Message is from a guild or from the bot user. Returning without processing.")
             return
-        gc = None
-        async with db.async_session() as session:
-            log.debug("Starting DB session")
-            gc = await session.scalar(select(db.GuildConfig).where(db.GuildConfig.guildId == message.guild.id))
-            if not gc:
-                # create one
-                log.debug("GuildConfig not found. Creating a new one.")
-                gc = db.GuildConfig(guildId=message.guild.id)
-                session.add(gc)
-                await session.commit()
+        gc = await self.bot.guildConfigs.get(message.guild.id)
         if not gc.tikTok and not interaction:
             log.debug("tikTok is not enabled for this guild. Returning without processing.")
             return
 
         # find the link to the video (first only)
-        match = None
-        for domain in DOMAINS:
-            log.debug(f"Searching for domain: {domain} in message content")
-            if match := re.search(rf'(https?://[^ ]*{domain}/[^ \n]*)', message.content):
-                if domain in ["youtube.com", "youtu.be"]:
-                    if 'shorts' in match.group(1) or 'clip' in match.group(1):
-                        log.debug("Match found for youtube SHORTS / CLIPS domain. Breaking loop.")
-                        break
-                else:
-                    log.debug(f"Match found for domain: {domain}. Breaking loop.")
-                    break
-
-        if not match:
+        links = find_video_links(message.content)
+        if not links:
             log.debug("No matching domain found in message content. Returning without processing.")
             return
 
         async with message.channel.typing():
             log.debug("Typing indicator started")
 
-        # REMOVED FROM HERE
+        messages = []
+        size_limit = message.guild.filesize_limit
         try:
-            Attachment_sets = await self.download_video(match.group(1), message.guild.filesize_limit)
+            async with self.scheduler.job(message.guild.id, message.author.id, mirror_key(links[0], size_limit)):
+                async for attachment_set in self.download_video(links[0], size_limit):
+                    messages.append(await message.reply(files=attachment_set))
+        except RateLimited:
+            log.debug(
+                f"{message.author} in {message.guild} is over the mirror rate limit. Returning without processing."
+            )
+            return
         except NotAVideo:
             log.debug("Not a video. Returning without processing.")
             return
-        except Exception as e:
-            log.error("Error downloading video", e)
+        except DiscordException:
+            log.exception("Error uploading video")
             return
-        try:
-            messages = [await message.reply(files=attachment_set) for attachment_set in Attachment_sets]
-        except Exception as e:
-            log.error("Error uploading video", e)
+        except Exception:
+            log.exception("Error downloading video")
             return
-        if messages[-1]:
+        if messages:
             uploaded = messages[-1]
             try:
                 await uploaded.add_reaction("🗑️")
@@ -284,40 +402,6 @@ class Video_DL(Cog):
                 # if we are here, someone with the power to do so want's to delete the upload
                 await uploaded.delete()
 
-    @staticmethod
-    @timing(log=log)
-    def transcode_shrink(content: io.BytesIO, limit: float) -> io.BytesIO:
-        limit = limit * 8
-        try:
-            with open("in.mp4", "wb") as f:
-                f.write(content.getvalue())
-            fprobe = subprocess.Popen(FFPROBE_CMD.split(' '), stdout=subprocess.PIPE)
-            fprobe.wait()
-            video_length = math.ceil(float(fprobe.communicate()[0].decode("utf-8")))
-            content.seek(0)  # reset data
-            if video_length > MAX_VIDEO_LENGTH:
-                raise commands.CommandInvokeError('Video is too large.')
-
-            target_total_bitrate = limit / video_length
-            buffer_size = math.floor(limit / BUFFER_CONSTANT)
-            target_video_bitrate = target_total_bitrate - AUDIO_BITRATE
-
-            command_formatted = FFMPEG_CMD.format(str(target_video_bitrate), str(AUDIO_BITRATE), str(buffer_size))
-            log.debug(f"Transcoding video with command: {command_formatted}")
-            ffmpeg = subprocess.Popen(command_formatted.split(' '))
-
-            ffmpeg.communicate()[0]
-            ffmpeg.wait()
-            with open("out.mp4", "rb") as f:
-                return io.BytesIO(f.read())
-        except Exception as e:
-            raise Exception('Exception occurred transcoding video', traceback.format_exc())
-        finally:
-            try:
-                os.remove("out.mp4")
-            except Exception:
-                pass
-
 
 async def setup(bot):
     await bot.add_cog(Video_DL(bot))
@@ -2,9 +2,9 @@ import asyncio
 from typing import List, Optional
 
 import discord
-from discord import VoiceState, app_commands
+from discord import app_commands
 
-from alexBot.database import GuildConfig, UserConfig, async_session, select
+from alexBot.classes import VoiceEvent
 from alexBot.tools import Cog, render_voiceState
 
 
@@ -133,7 +133,10 @@ class VoiceCommands(Cog):
         if not interaction.user.voice:
             return await interaction.response.send_message("you must be in a voice call!", ephemeral=True)
         await interaction.response.defer()
-        for user in interaction.user.voice.channel.members:
+        members = list(interaction.user.voice.channel.members)
+        # load everyone's config in one query first, so the voice state updates the moves cause are all cache hits
+        await self.bot.userConfigs.get_many([member.id for member in members])
+        for user in members:
             asyncio.get_event_loop().create_task(user.move_to(target, reason=f"as requested by {interaction.user}"))
         await interaction.followup.send(":ok_hand:", ephemeral=True)
 
@@ -164,36 +167,26 @@ class VoiceCommands(Cog):
             pass
 
     @Cog.listener()
-    async def on_voice_state_update(self, member: discord.Member, before: VoiceState, after: VoiceState):
-        if before.channel.id in self.current_thatars:
+    async def on_voice_event(self, event: VoiceEvent):
+        member, before = event.member, event.before
+        if before.channel and before.channel.id in self.current_thatars:
             if len(before.channel.members) == 0:
                 await before.channel.delete(reason="no one left")
                 self.current_thatars.remove(before.channel.id)
         guild = member.guild
-        if (before.channel and after.channel is None) or (before.channel is None and after.channel is not None):
+        if event.joined or event.left:
             # person joined / left
-            async with async_session() as session:
-                gc = await session.scalar(select(GuildConfig).where(GuildConfig.guildId == guild.id))
-                if not gc:
-                    gc = GuildConfig(guild.id)
-                    session.add(gc)
-                    await session.commit()
-                if gc.allowUnMuteAndDeafenOnJoin:  # server allows it
-                    uc = await session.scalar(select(UserConfig).where(UserConfig.userId == member.id))
-                    if not uc:
-                        uc = UserConfig(member.id)
-                        session.add(uc)
-                        await session.commit()
-                    if uc.unMuteAndDeafenOnJoin:  # user wants it
-                        if before.channel is None and after.channel is not None and member.id not in self.unmute_noops:
-                            # initial join, we can just blindly unmute and undeafen
-                            # but first we need to wait a moment for the user to be actually connected and accept the mute/deafen
-                            await (await guild.fetch_member(member.id)).edit(mute=False, deafen=False)
-                        elif before.channel is not None and after.channel is None:
-                            # they left, we need to add them to our list of no-ops for 5 minutes
-                            self.unmute_noops[member.id] = True
-                            await asyncio.sleep(5 * 60)
-                            del self.unmute_noops[member.id]
+            if event.guildConfig.allowUnMuteAndDeafenOnJoin:  # server allows it
+                if event.userConfig.unMuteAndDeafenOnJoin:  # user wants it
+                    if event.joined and member.id not in self.unmute_noops:
+                        # initial join, we can just blindly unmute and undeafen
+                        # but first we need to wait a moment for the user to be actually connected and accept the mute/deafen
+                        await (await guild.fetch_member(member.id)).edit(mute=False, deafen=False)
+                    elif event.left:
+                        # they left, we need to add them to our list of no-ops for 5 minutes
+                        self.unmute_noops[member.id] = True
+                        await asyncio.sleep(5 * 60)
+                        del self.unmute_noops[member.id]
 
     @app_commands.guild_only()
     @app_commands.checks.bot_has_permissions(move_members=True)
@@ -354,22 +347,19 @@ class VoiceCommands(Cog):
             # this should never happen tbh
             return await interaction.response.send_message("you're not in a voice channel", ephemeral=True)
         await interaction.response.defer(thinking=True)
-        async with async_session() as session:
-            uds = await session.scalars(select(UserConfig).where(UserConfig.userId.in_([z.id for z in vc.members])))
-            for user in vc.members:
-                # get the user config for this user
-                ud = next((x for x in uds if x.userId == user.id), None)
-                if not ud:
-                    ud = UserConfig(user.id)
-
-                if ud.voiceSleepMute and ud.dontVoiceSleep:
-                    await user.edit(reason=f"sleep requested by {interaction.user}", mute=True)
-                elif ud.voiceSleepMute and not ud.dontVoiceSleep:
-                    await user.edit(reason=f"sleep requested by {interaction.user}", mute=True, deafen=True)
-                elif not ud.voiceSleepMute and ud.dontVoiceSleep:
-                    await user.edit(reason=f"sleep requested by {interaction.user}", deafen=True)
-                elif not ud.voiceSleepMute and not ud.dontVoiceSleep:
-                    pass  # do nothing
+        uds = await self.bot.userConfigs.get_many([z.id for z in vc.members])
+        for user in vc.members:
+            # get the user config for this user
+            ud = uds[user.id]
+
+            if ud.voiceSleepMute and ud.dontVoiceSleep:
+                await user.edit(reason=f"sleep requested by {interaction.user}", mute=True)
+            elif ud.voiceSleepMute and not ud.dontVoiceSleep:
+                await user.edit(reason=f"sleep requested by {interaction.user}", mute=True, deafen=True)
+            elif not ud.voiceSleepMute and ud.dontVoiceSleep:
+                await user.edit(reason=f"sleep requested by {interaction.user}", deafen=True)
+            elif not ud.voiceSleepMute and not ud.dontVoiceSleep:
+                pass  # do nothing
 
         await interaction.followup.send("ok, sleep well :zzz:", ephemeral=False)
 
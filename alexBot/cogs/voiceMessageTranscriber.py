@@ -1,22 +1,42 @@
-import functools
-import io
+import asyncio
+import hashlib
 import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
 
 import discord
 from discord import app_commands
-import pydub
-import speech_recognition
 
-from alexBot import database as db
+from alexBot import metrics
+from alexBot.caches import TranscriptionCache
+from alexBot.transcription import TranscriptionService
 
 from ..tools import Cog
 
 log = logging.getLogger(__name__)
 
+# seconds between edits of a transcription in progress. the finished text is always sent
+EDIT_INTERVAL = 2
+
+
+def content_hash(audio: bytes) -> str:
+    """what transcriptions are shared between attachments by. runs in the bot's io executor, hashlib drops the GIL"""
+    return hashlib.sha256(audio).hexdigest()
+
 
 class VoiceMessageTranscriber(Cog):
     def __init__(self, bot):
         super().__init__(bot)
+        self.transcriber = TranscriptionService(
+            bot.cpuExecutor,
+            bot.config.whisper_model,
+            bot.config.transcribe_batch_size,
+            bot.config.transcribe_batch_window,
+        )
+        self.transcriptions = TranscriptionCache()
+        metrics.register_cache("transcription", self.transcriptions)
+        # attachment id: the transcription in progress, so asking again while it runs waits for it
+        self.inflight: Dict[int, asyncio.Task] = {}
 
         self.voiceMessageTranscriberMenu = app_commands.ContextMenu(
             name='Transcribe Voice Message',
@@ -31,6 +51,7 @@ class VoiceMessageTranscriber(Cog):
         ]
         for command in commands:
             self.bot.tree.add_command(command)
+        self.transcriber.start()
 
     async def cog_unload(self) -> None:
         commands = [
@@ -38,6 +59,7 @@ class VoiceMessageTranscriber(Cog):
         ]
         for command in commands:
             self.bot.tree.remove_command(command.name, type=command.type)
+        await self.transcriber.close()
 
     async def transcribe_command_on_demand(self, interaction: discord.Interaction, message: discord.Message):
 
@@ -51,29 +73,49 @@ class VoiceMessageTranscriber(Cog):
 
         await interaction.response.defer(ephemeral=True)
 
-        # Read voice file and converts it into something pydub can work with
-        log.debug(f"Reading voice file. message.id={message.id}")
-        voice_file = await message.attachments[0].read()
-        voice_file = io.BytesIO(voice_file)
-
-        result = await self.transcribe(voice_file)
+        setting = "auto"
+        if interaction.guild_id and self.bot.get_guild(interaction.guild_id):
+            setting = (await self.bot.guildConfigs.get(interaction.guild_id)).transcriptionModel
+        result = await self.transcribe(message.attachments[0], setting=setting)
         await interaction.followup.send(content=f"**Audio Message Transcription:\n** ```{result}```", ephemeral=True)
 
-    async def transcribe(self, audio: io.BytesIO) -> str:
-        x = await self.bot.loop.run_in_executor(None, pydub.AudioSegment.from_file, audio)
-        new = io.BytesIO()
-        await self.bot.loop.run_in_executor(None, functools.partial(x.export, new, format='wav'))
+    async def transcribe(
+        self,
+        attachment: discord.Attachment,
+        on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+        setting: str = "auto",
+    ) -> str:
+        """
+        transcribe a voice message, from the cache if it was done before. `on_partial` is awaited with the text so
+        far while a long message is transcribed, unless someone else already started transcribing it.
+        `setting` is the guild's transcriptionModel, the model itself is picked by the transcription service
+        """
+        if (task := self.inflight.get(attachment.id)) is None:
+            task = self.inflight[attachment.id] = asyncio.create_task(self._transcribe(attachment, on_partial, setting))
+            task.add_done_callback(lambda _: self.inflight.pop(attachment.id, None))
+        # shielded, so one requester giving up doesn't cancel it for everyone else
+        result = await asyncio.shield(task)
+        return result if result != "" else "*Nothing*"
+
+    async def _transcribe(
+        self, attachment: discord.Attachment, on_partial: Optional[Callable[[str], Awaitable[None]]], setting: str
+    ) -> str:
+        if (cached := await self.transcriptions.get(attachment.id)) is not None:
+            log.debug(f"Transcription of {attachment.id} was cached.")
+            return cached
 
-        # Convert .wav file into speech_recognition's AudioFile format or whatever idrk
-        log.debug("Converting file to AudioFile format.")
-        recognizer = speech_recognition.Recognizer()
-        with speech_recognition.AudioFile(new) as source:
-            audio = await self.bot.loop.run_in_executor(None, recognizer.record, source)
+        log.debug(f"Reading voice file. attachment.id={attachment.id}")
+        audio = await attachment.read()
+        contentHash = await self.bot.ioExecutor.run(content_hash, audio)
+        if (cached := await self.transcriptions.get_by_hash(attachment.id, contentHash)) is not None:
+            log.debug(f"Transcription of {attachment.id} was cached under another attachment.")
+            return cached
 
         # Runs the file through OpenAI Whisper
         log.debug("Running file through OpenAI Whisper.")
-        result = await self.bot.loop.run_in_executor(None, recognizer.recognize_whisper, audio)
-        return result if result != "" else "*Nothing*"
+        result = await self.transcriber.transcribe(audio, on_partial, setting)
+        await self.transcriptions.put(attachment.id, contentHash, result)
+        return result
 
     @Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -83,13 +125,7 @@ class VoiceMessageTranscriber(Cog):
         if not message.flags.voice:
             return
         log.debug(f"Getting guild data for {message.guild}")
-        gc = None
-        async with db.async_session() as session:
-            gc = await session.get(db.GuildConfig, message.guild.id)
-            if not gc:
-                gc = db.GuildConfig(guildId=message.guild.id)
-                session.add(gc)
-                await session.commit()
+        gc = await self.bot.guildConfigs.get(message.guild.id)
 
         if gc.transcribeVoiceMessages:
             if message.attachments[0].content_type != "audio/ogg":
@@ -98,13 +134,20 @@ class VoiceMessageTranscriber(Cog):
                 return
 
             msg = await message.reply("✨ Transcribing...", mention_author=False)
-
-            # Read voice file and converts it into something pydub can work with
-            log.debug(f"Reading voice file. message.id={message.id}")
-            voice_file = await message.attachments[0].read()
-            voice_file = io.BytesIO(voice_file)
-
-            result = await self.transcribe(voice_file)
+            # the first piece is shown as soon as it's ready, later ones at most every EDIT_INTERVAL
+            lastEdit = 0.0
+
+            async def on_partial(text: str):
+                nonlocal lastEdit
+                if not text or time.monotonic() - lastEdit < EDIT_INTERVAL:
+                    return
+                lastEdit = time.monotonic()
+                try:
+                    await msg.edit(content=f"**Audio Message Transcription:\n** ```{text} ...```")
+                except discord.HTTPException as e:
+                    log.debug(f"Couldn't show partial transcription: {e}")
+
+            result = await self.transcribe(message.attachments[0], on_partial, gc.transcriptionModel)
             await msg.edit(content=f"**Audio Message Transcription:\n** ```{result}```")
 
 
@@ -5,13 +5,12 @@ import datetime
 from asyncio import Task
 from typing import TYPE_CHECKING, Dict, List
 
-from alexBot import database as db
+from alexBot.classes import VoiceEvent
 
 if TYPE_CHECKING:
     from bot import Bot
 
 import discord
-from discord.member import VoiceState
 
 from ..tools import Cog
 
@@ -23,21 +22,13 @@ class VoicePrivVC(Cog):
         self.beingShaken: Dict[int, bool] = {}
 
     @Cog.listener()
-    async def on_voice_state_update(self
-                                    , member: discord.Member
-                                    , before: VoiceState
-                                    , after: VoiceState):
+    async def on_voice_event(self, event: VoiceEvent):
         """
         only for actions in nerdiowo
         hide events that do with ther admin category in any way
         """
-        async with db.async_session() as session:
-            gd = await session.get(db.GuildConfig, member.guild.id)
-            if not gd:
-                gd = db.GuildConfig(guildId=member.guild.id)
-                session.add(gd)
-                await session.commit()
-        if gd.privateOnePersonVCs:
+        member, before, after = event.member, event.before, event.after
+        if event.guildConfig.privateOnePersonVCs:
             if after.channel and after.channel.user_limit == 1 and len(after.channel.members) == 1:
                 # give the user channel override for manage menbers
                 await after.channel.set_permissions(member
@@ -8,7 +8,8 @@ import discord
 from discord import app_commands
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from alexBot.database import GuildConfig, UserConfig, VoiceStat, async_session, select
+from alexBot.classes import VoiceEvent
+from alexBot.database import VoiceStat, async_session, select
 from alexBot.tools import Cog
 
 log = logging.getLogger(__name__)
@@ -36,28 +37,24 @@ class VoiceStats(Cog):
                 await session.commit()
 
     @Cog.listener()
-    async def on_voice_state_update(
-        self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState
-    ):
-        if before.channel is not None and after.channel is not None:  # check that joined or left a voice call
+    async def on_voice_event(self, event: VoiceEvent):
+        if not event.joined and not event.left:  # check that joined or left a voice call
+            return
+        member = event.member
+        channel = event.channel
+        # ?? can we gather data from this guild / user?
+        gc = event.guildConfig
+        uc = event.userConfig
+        if not gc.collectVoiceData and not uc.collectVoiceData:
             return
-        channel: Union[discord.VoiceChannel, discord.StageChannel] = before.channel or after.channel  # type: ignore
-        # ?? can we gather data from this guild?
-        gc = None
         async with async_session() as session:
-            gc = await session.scalar(select(GuildConfig).where(GuildConfig.guildId == channel.guild.id))
-            if not gc:
-                gc = GuildConfig(guildId=channel.guild.id)
-                session.add(gc)
-                await session.commit()
-
             # ?? are we getting an event for someone leaving?
-            LEAVING = bool(before.channel)
+            LEAVING = event.left
 
             # ?? were they the last person?
-            LAST = len([m for m in channel.members if not m.bot]) == 0
+            LAST = event.humansBefore == 0
 
-            FIRST = not LEAVING and len([m for m in after.channel.members if not m.bot]) == 1  # type: ignore  # after.channel is gareted if not leaving
+            FIRST = event.joined and event.humansAfter == 1
 
             if LEAVING and LAST and gc.collectVoiceData:
                 # definitly ending of a call
@@ -66,11 +63,6 @@ class VoiceStats(Cog):
             if not LEAVING and FIRST and gc.collectVoiceData:
                 await self.starting_a_call(channel, session)
 
-            uc = await session.scalar(select(UserConfig).where(UserConfig.userId == member.id))
-            if not uc:
-                uc = UserConfig(userId=member.id)
-                session.add(uc)
-                await session.commit()
             if uc.collectVoiceData:
                 if LEAVING:
                     await self.member_leaving_call(member, channel, session)
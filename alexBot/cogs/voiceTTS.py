@@ -3,15 +3,20 @@ import ctypes
 import dataclasses
 import io
 import logging
+import os
 import re
+import subprocess
+import unicodedata
 from typing import Dict, List, Optional
 
 import discord
 from asyncgTTS import AsyncGTTSSession, ServiceAccount, SynthesisInput, TextSynthesizeRequestBody, VoiceSelectionParams
 from discord import app_commands
+from discord.oggparse import OggStream
 
-from alexBot.classes import googleVoices
-from alexBot.database import UserConfig, async_session, select
+from alexBot import metrics
+from alexBot.caches import DiskLRUCache
+from alexBot.classes import VoiceEvent, googleVoices
 from alexBot.tools import Cog
 
 log = logging.getLogger(__name__)
@@ -35,6 +40,55 @@ EMOJIREGEX = re.compile(r"<a?:([a-zA-Z0-9_]+):(\d+)>")
 
 LINKREGEX = re.compile(r"https?://(.+\.[a-z]+)/?[a-zA-Z0-9/\-=+#\?]*")
 
+# phrases up to this long are cached. longer messages are rarely repeated, and would push the short ones out
+TTS_CACHE_MAX_LENGTH = 100
+# the same format FFmpegOpusAudio asks ffmpeg for, so cached files can be sent to discord as they are
+OPUS_ENCODE_CMD = 'ffmpeg -v error -nostdin -i pipe:0 -map_metadata -1 -f opus -c:a libopus -ar 48000 -ac 2 -b:a 64k'
+# seconds. a cacheable phrase is a few seconds of audio, ffmpeg taking longer than this is stuck
+OPUS_ENCODE_TIMEOUT = 30
+
+
+def normalize_tts_text(text: str) -> str:
+    """the same phrase typed slightly differently should hit the same cache entry"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+async def encode_opus(audio: bytes, path: str):
+    """
+    encode synthesized speech to an ogg opus file at `path`, ready to be played with OggOpusAudio.
+    ffmpeg is killed if it takes longer than OPUS_ENCODE_TIMEOUT, or this is cancelled
+    """
+    command = OPUS_ENCODE_CMD.split(' ') + ['-y', path]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        async with asyncio.timeout(OPUS_ENCODE_TIMEOUT):
+            _, stderr = await process.communicate(audio)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+
+class OggOpusAudio(discord.AudioSource):
+    """plays an ogg opus file as it is, without running it through ffmpeg"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._packets = OggStream(self._file).iter_packets()
+
+    def read(self) -> bytes:
+        return next(self._packets, b'')
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        self._file.close()
+
 
 @dataclasses.dataclass
 class TTSUserInstance:
@@ -55,6 +109,11 @@ class VoiceTTS(Cog):
         self.runningTTS: Dict[int, TTSInstance] = {}
         self.gtts: AsyncGTTSSession = None  # type: ignore
         self.running_queue_handlers: Dict[int, bool] = {}
+        self.ttsCache = DiskLRUCache(bot.config.tts_cache_dir, bot.config.tts_cache_size)
+        metrics.register_cache("tts", self.ttsCache)
+        metrics.register(
+            metrics.Gauge("alexbot_tts_cache_bytes", "size of the tts cache on disk", lambda: self.ttsCache.size)
+        )
 
     async def cog_load(self):
         if not self.bot.config.google_service_account:
@@ -99,19 +158,18 @@ class VoiceTTS(Cog):
             )
 
     @Cog.listener()
-    async def on_voice_state_update(
-        self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState
-    ):
+    async def on_voice_event(self, event: VoiceEvent):
+        member = event.member
         ttsInstance = self.runningTTS.get(member.guild.id)
         if not ttsInstance:
             return
-        if after.channel is not None:
+        if not event.left:
             return
         # someone left a voice channel. do we care?
         if member.guild and member.guild.id in self.runningTTS and member.id in ttsInstance.users:
             del ttsInstance.users[member.id]
 
-        if self.bot.user.id == member.id and after.channel is None and member.guild.id in self.runningTTS:
+        if self.bot.user.id == member.id and event.after.channel is None and member.guild.id in self.runningTTS:
             del self.runningTTS[member.guild.id]
 
         if len(ttsInstance.users) == 0:
@@ -121,18 +179,29 @@ class VoiceTTS(Cog):
     async def sendTTS(self, text: str, ttsInstance: TTSInstance, ttsUser: TTSUserInstance):
         if not ttsInstance.voiceClient.is_connected():
             return
+        text = normalize_tts_text(text)
         log.debug(f"Sending TTS: {text=}")
-        try:
-            synth_bytes = await self.gtts.synthesize(
-                TextSynthesizeRequestBody(SynthesisInput(text), voice_input=ttsUser.vsParams)
-            )
-        except Exception as e:
-            log.exception(e)
-            return
-        buff_sound = io.BytesIO(synth_bytes)
-
-        sound = discord.FFmpegOpusAudio(buff_sound, pipe=True)
-        ttsInstance.queue.append(sound)
+        cacheKey = f"{ttsUser.vsParams.name}\n{text}"
+        cacheable = len(text) <= TTS_CACHE_MAX_LENGTH
+        if cacheable and (cached := self.ttsCache.get(cacheKey)):
+            ttsInstance.queue.append(OggOpusAudio(cached))
+        else:
+            try:
+                synth_bytes = await self.gtts.synthesize(
+                    TextSynthesizeRequestBody(SynthesisInput(text), voice_input=ttsUser.vsParams)
+                )
+                if cacheable:
+                    # encoded once, into the cache, and played from there from now on
+                    with self.ttsCache.tempdir() as workdir:
+                        path = os.path.join(workdir, "tts.ogg")
+                        await encode_opus(synth_bytes, path)
+                        sound = OggOpusAudio(self.ttsCache.put(cacheKey, path, "tts.ogg"))
+                else:
+                    sound = discord.FFmpegOpusAudio(io.BytesIO(synth_bytes), pipe=True)
+            except Exception as e:
+                log.exception(e)
+                return
+            ttsInstance.queue.append(sound)
         if not self.running_queue_handlers.get(ttsInstance.voiceClient.guild.id):
             await self.queue_handler(ttsInstance)
 
@@ -167,13 +236,12 @@ class VoiceTTS(Cog):
                     discord.app_commands.Choice(name="End your Voice TTS", value="QUIT"),
                 ]
         chc = []
-        async with async_session() as db_session:
-            userData = await db_session.scalar(select(UserConfig).where(UserConfig.userId == interaction.user.id))
-            if userData and userData.voiceModel and interaction.guild_id:
-                if self.runningTTS.get(interaction.guild_id) and userData.voiceModel not in [
-                    z[1].vsParams.name for z in self.runningTTS[interaction.guild_id].users.items()
-                ]:
-                    chc.append(discord.app_commands.Choice(name=f"SAVED ({userData.voiceModel})", value="SAVED"))
+        userData = await self.bot.userConfigs.get_or_create(interaction.user.id)
+        if userData.voiceModel and interaction.guild_id:
+            if self.runningTTS.get(interaction.guild_id) and userData.voiceModel not in [
+                z[1].vsParams.name for z in self.runningTTS[interaction.guild_id].users.items()
+            ]:
+                chc.append(discord.app_commands.Choice(name=f"SAVED ({userData.voiceModel})", value="SAVED"))
         if interaction.guild_id and interaction.guild_id in self.runningTTS:
             instance = self.runningTTS[interaction.guild_id]
             existing = [z.vsParams.name for z in instance.users.values()]
@@ -192,22 +260,13 @@ class VoiceTTS(Cog):
         
         if model == "SAVED":
             # we pull from database, and use that
-            async with async_session() as session:
-                userData = await session.scalar(select(UserConfig).where(UserConfig.userId == interaction.user.id))
-                if not userData:
-                    userData = UserConfig(interaction.user.id)
-                    session.add(userData)
-                    await session.commit()
-                    await interaction.response.send_message(
-                        "You have not set a voice preference. use `/config user set` to set one", ephemeral=True
-                    )
-                    return
-                if not userData.voiceModel:
-                    await interaction.response.send_message(
-                        "You have not set a voice preference. use `/config user set` to set one", ephemeral=True
-                    )
-                    return
-                model = userData.voiceModel
+            userData = await self.bot.userConfigs.get_or_create(interaction.user.id)
+            if not userData.voiceModel:
+                await interaction.response.send_message(
+                    "You have not set a voice preference. use `/config user set` to set one", ephemeral=True
+                )
+                return
+            model = userData.voiceModel
 
         if model not in [z[0] for z in googleVoices]:
             # check if it's a valid voice overall
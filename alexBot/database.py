@@ -1,21 +1,32 @@
+import asyncio
 import datetime
+import json
+import logging
 import os
+import time
 import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Set
 
+import asyncpg
 import discord
 
 # from alexBot.classes import
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, Interval, String, select
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, Interval, String, event, make_url, select
 from sqlalchemy.dialects.postgresql import BIGINT, UUID
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 import config
+from alexBot import metrics
 from alexBot.classes import SugeryZone
 from alexBot.tools import time_cache
 
 from pytz import tzinfo
 
+log = logging.getLogger(__name__)
+
 
 class Base(
     MappedAsDataclass,
@@ -51,6 +62,16 @@ class Reminder(Base):
     """a reminder. can be recurring (set frequency) or one time (no frequency) target is the id of the channel that the reminder is sent in."""
 
     __tablename__ = "reminders"
+    __table_args__ = (
+        Index("ix_reminders_guildId_next_remind", "guildId", "next_remind", "id"),
+        Index("ix_reminders_owner_next_remind", "owner", "next_remind", "id"),
+        Index(
+            "ix_reminders_message_trgm",
+            "message",
+            postgresql_using="gin",
+            postgresql_ops={"message": "gin_trgm_ops"},
+        ),
+    )
     target: Mapped[int] = mapped_column(BIGINT(), nullable=False)
     owner: Mapped[int] = mapped_column(BIGINT(), nullable=False)
     guildId: Mapped[Optional[int]] = mapped_column(BIGINT(), nullable=True)
@@ -59,6 +80,9 @@ class Reminder(Base):
     frequency: Mapped[Optional[datetime.timedelta]] = mapped_column(Interval(), nullable=True)
     require_clearing: Mapped[bool] = mapped_column(Boolean(), default=False)
     auto_react: Mapped[bool] = mapped_column(Boolean(), default=False)
+    # which bot process is currently sending this reminder, and until when. see Reminders.claim
+    leased_by: Mapped[Optional[str]] = mapped_column(String(), nullable=True, default=None)
+    leased_until: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(True), nullable=True, default=None)
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default_factory=uuid.uuid4)
 
     @time_cache(300)
@@ -70,6 +94,28 @@ class Reminder(Base):
         return False
 
 
+class PendingClear(Base):
+    """a sent require_clearing reminder that hasn't been acknowledged yet. the bot nags in the channel until it is."""
+
+    __tablename__ = "pendingclears"
+    messageId: Mapped[int] = mapped_column(BIGINT(), primary_key=True)
+    channelId: Mapped[int] = mapped_column(BIGINT(), nullable=False, index=True)
+    next_nag: Mapped[datetime.datetime] = mapped_column(DateTime(True), nullable=False)
+    nags: Mapped[int] = mapped_column(Integer(), nullable=False, default=0)
+
+
+class Transcription(Base):
+    """whisper's transcription of a voice message attachment. contentHash is the sha256 of the audio"""
+
+    __tablename__ = "transcriptions"
+    attachmentId: Mapped[int] = mapped_column(BIGINT(), primary_key=True)
+    contentHash: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    text: Mapped[str] = mapped_column(String(), nullable=False)
+    created: Mapped[datetime.datetime] = mapped_column(
+        DateTime(True), nullable=False, default_factory=lambda: datetime.datetime.now(datetime.UTC)
+    )
+
+
 class GuildConfig(Base):
     __tablename__ = "guildconfigs"
     __config_keys__ = [
@@ -82,6 +128,7 @@ class GuildConfig(Base):
         "transcribeVoiceMessages",
         "minecraft",
         "allowUnMuteAndDeafenOnJoin",
+        "transcriptionModel",
     ]
     __config_docs__ = {
         "ayy": "sending `ayy` responds with  `lmao` is enabled",
@@ -93,6 +140,7 @@ class GuildConfig(Base):
         "transcribeVoiceMessages": "voice messages are transcribed in chat",
         "minecraft": "the minecraft server ip for the default to /minecraft",
         "allowUnMuteAndDeafenOnJoin": "users can be un-server-muted and deafened when joining a VC",
+        "transcriptionModel": "whisper model for voice messages: auto, tiny, base or small",
     }
     guildId: Mapped[int] = mapped_column(BIGINT(), primary_key=True)
     ayy: Mapped[bool] = mapped_column(Boolean(), default=False)
@@ -104,6 +152,7 @@ class GuildConfig(Base):
     transcribeVoiceMessages: Mapped[bool] = mapped_column(Boolean(), default=False)
     minecraft: Mapped[str] = mapped_column(String(), default="")
     allowUnMuteAndDeafenOnJoin: Mapped[bool] = mapped_column(Boolean(), server_default="false", default=False)
+    transcriptionModel: Mapped[str] = mapped_column(String(), server_default="auto", default="auto")
 
 
 class UserConfig(Base):
@@ -209,8 +258,125 @@ elif config.db_full_url is None:
     if None in (user, pw, db, db_host, db_port):
         raise ValueError("Missing database environment variable")
 
-engine = create_async_engine(database_url)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """the default pool for asyncpg, timing how long each checkout waits for a free connection"""
+
+    def _do_get(self):
+        with CHECKOUT_WAIT.time():
+            return super()._do_get()
+
+
+CHECKOUT_WAIT = metrics.register(
+    metrics.Histogram("alexbot_db_checkout_wait_seconds", "time spent waiting for a pooled database connection")
+)
+QUERY_TIME = metrics.register(
+    metrics.Histogram("alexbot_db_query_seconds", "database statement latency", label="statement")
+)
+
+engine = create_async_engine(
+    make_url(database_url).update_query_dict({"prepared_statement_cache_size": str(config.db_statement_cache_size)}),
+    poolclass=TimedQueuePool,
+    pool_size=config.db_pool_size,
+    max_overflow=config.db_max_overflow,
+    pool_timeout=config.db_pool_timeout,
+    pool_pre_ping=config.db_pool_pre_ping,
+)
+metrics.register(
+    metrics.Gauge("alexbot_db_pool_checked_out", "database connections in use", lambda: engine.pool.checkedout())
+)
+metrics.register(metrics.Gauge("alexbot_db_pool_size", "configured database pool size", lambda: engine.pool.size()))
+metrics.register(
+    metrics.Gauge("alexbot_db_pool_overflow", "database connections over pool_size", lambda: engine.pool.overflow())
+)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    # statements are parameterized, so there's one series per query in the code. whitespace is normalized for display
+    QUERY_TIME.observe(time.perf_counter() - started, " ".join(statement.split())[:200])
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _query_failed(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
 async_session = async_sessionmaker(
     engine,
     expire_on_commit=False,
 )
+
+
+# the channel the notify_row_change trigger (see alembic revision 8f2d6c1a9b3e) publishes to
+CHANGES_CHANNEL = "alexbot_row_changes"
+# seconds between attempts to reconnect the change feed, doubling from the min to the max
+CHANGE_FEED_MIN_BACKOFF = 1
+CHANGE_FEED_MAX_BACKOFF = 60
+
+
+@dataclass
+class RowChange:
+    """a row in a watched table changed. key is the primary key, as text."""
+
+    table: str
+    op: str  # INSERT, UPDATE or DELETE
+    key: str
+
+
+async def listen_for_changes(
+    on_change: Callable[[RowChange], Awaitable[None]], on_connect: Callable[[], Awaitable[None]]
+):
+    """
+    LISTEN for row changes on a dedicated connection (so it doesn't hold a pool slot forever), forever.
+    on_connect is awaited every time the connection is (re)established, so callers can resync anything they missed.
+    """
+    # asyncpg would send the sqlalchemy-only query options to the server as settings
+    url = engine.url.set(drivername="postgresql").difference_update_query(["prepared_statement_cache_size"])
+    dsn = url.render_as_string(hide_password=False)
+
+    # handlers still running. the loop only keeps weak references to tasks
+    handlers: Set[asyncio.Task] = set()
+
+    def handled(task: asyncio.Task):
+        handlers.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error("error handling a row change", exc_info=task.exception())
+
+    def notified(connection, pid, channel, payload):
+        try:
+            change = RowChange(**json.loads(payload))
+        except (TypeError, ValueError):
+            log.error(f"bad change notification: {payload}")
+            return
+        task = asyncio.create_task(on_change(change))
+        handlers.add(task)
+        task.add_done_callback(handled)
+
+    delay = CHANGE_FEED_MIN_BACKOFF
+    while True:
+        try:
+            connection: asyncpg.Connection = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(CHANGES_CHANNEL, notified)
+                await on_connect()
+                delay = CHANGE_FEED_MIN_BACKOFF
+                await lost.wait()
+            finally:
+                await connection.close()
+            log.warning("lost the change feed connection, reconnecting")
+        except Exception as e:
+            # anything, including resyncing in on_connect, just means we try again later. if this task died,
+            # every cache fed by it would quietly go stale
+            log.exception(f"change feed error, retrying in {delay} seconds", exc_info=e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CHANGE_FEED_MAX_BACKOFF)
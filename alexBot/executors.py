@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Tuple, TypeVar
+
+from alexBot import metrics
+
+log = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# seconds. executor work ranges from quick file reads to minutes of speech recognition
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+WAIT_TIME = metrics.register(
+    metrics.Histogram(
+        "alexbot_executor_wait_seconds", "time work waited for a free worker", label="executor", buckets=BUCKETS
+    )
+)
+TASK_TIME = metrics.register(
+    metrics.Histogram("alexbot_executor_task_seconds", "time work took to run", label="executor", buckets=BUCKETS)
+)
+
+
+def _timed(function: Callable[..., _T]) -> Tuple[float, _T, float]:
+    # runs in the worker. wall clock, so the times still line up when the worker is another process
+    started = time.time()
+    result = function()
+    return started, result, time.time()
+
+
+class NamedExecutor:
+    """
+    an executor with a name, that records how long work waits for a worker and how long it runs.
+    blocking work should go through one of the bot's executors instead of the loop's default one,
+    so a pile of one kind of work can't hold up the others.
+    """
+
+    def __init__(self, name: str, executor: Executor, workers: int):
+        self.name = name
+        self.executor = executor
+        self.workers = workers
+        # submitted and not finished yet
+        self.pending = 0
+        metrics.register(
+            metrics.Gauge(f"alexbot_executor_{name}_queued", f"work waiting for a {name} worker", lambda: self.queued)
+        )
+        metrics.register(
+            metrics.Gauge(
+                f"alexbot_executor_{name}_running", f"{name} workers busy", lambda: min(self.pending, self.workers)
+            )
+        )
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.pending - self.workers)
+
+    async def run(self, function: Callable[..., _T], *args, **kwargs) -> _T:
+        """run function(*args, **kwargs) in this executor. for process pools it has to be picklable"""
+        submitted = time.time()
+        self.pending += 1
+        try:
+            started, result, finished = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _timed, functools.partial(function, *args, **kwargs)
+            )
+        finally:
+            self.pending -= 1
+        WAIT_TIME.observe(max(0.0, started - submitted), self.name)
+        TASK_TIME.observe(finished - started, self.name)
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def io_executor(workers: int) -> NamedExecutor:
+    """threads for blocking file and network calls, and libraries that release the GIL"""
+    return NamedExecutor("io", ThreadPoolExecutor(max_workers=workers, thread_name_prefix="io"), workers)
+
+
+def cpu_executor(workers: int) -> NamedExecutor:
+    """
+    processes for CPU bound python, like speech recognition, so it doesn't fight the event loop for the GIL.
+    forked, because spawned workers would re-run bot.py on import.
+    """
+    context = multiprocessing.get_context("fork")
+    return NamedExecutor("cpu", ProcessPoolExecutor(max_workers=workers, mp_context=context), workers)
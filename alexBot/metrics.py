@@ -0,0 +1,151 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+# seconds. roughly 1ms to 10s, which covers both database queries and slower work like downloads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    """
+    a prometheus style histogram, optionally split by the value of one label.
+    only the first `maxSeries` label values get their own series, everything after that is counted as "other".
+    """
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        label: Optional[str] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        maxSeries: int = 200,
+    ):
+        self.name = name
+        self.doc = doc
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.maxSeries = maxSeries
+        # label value: (count per bucket, plus one for +Inf), sum
+        self.series: Dict[str, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labelValue: str = ""):
+        if labelValue not in self.series:
+            if len(self.series) >= self.maxSeries:
+                labelValue = "other"
+            self.series.setdefault(labelValue, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts, total = self.series[labelValue]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, labelValue: str = "") -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labelValue)
+
+    def count(self, labelValue: str = "") -> int:
+        return sum(self.series[labelValue][0]) if labelValue in self.series else 0
+
+    def total(self, labelValue: str = "") -> float:
+        return self.series[labelValue][1][0] if labelValue in self.series else 0.0
+
+    def quantile(self, q: float, labelValue: str = "") -> float:
+        """estimate a quantile, as the upper bound of the bucket it falls in"""
+        if labelValue not in self.series:
+            return 0.0
+        counts = self.series[labelValue][0]
+        target = q * sum(counts)
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for labelValue, (counts, total) in self.series.items():
+            labels = {self.label: labelValue} if self.label else {}
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """a value that's read when the metrics are rendered"""
+
+    def __init__(self, name: str, doc: str, read: Callable[[], float]):
+        self.name = name
+        self.doc = doc
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+REGISTRY: Dict[str, Union[Histogram, Gauge]] = {}
+
+
+def register(metric):
+    """add a metric to the ones served by the metrics endpoint. returns the metric"""
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+def register_cache(name: str, cache):
+    """export the hits, misses and hit rate of one of the caches in alexBot.caches"""
+    register(Gauge(f"alexbot_{name}_cache_hits", f"{name} cache hits", lambda: cache.hits))
+    register(Gauge(f"alexbot_{name}_cache_misses", f"{name} cache misses", lambda: cache.misses))
+    register(
+        Gauge(
+            f"alexbot_{name}_cache_hit_ratio", f"share of {name} lookups served from the cache", lambda: cache.hit_rate
+        )
+    )
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY.values():
+        try:
+            lines += metric.render()
+        except Exception as e:
+            log.exception(e)
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(port: int) -> web.AppRunner:
+    """serve render_prometheus() at /metrics on `port`."""
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    log.info(f"serving metrics on port {port}")
+    return runner
@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List, Optional, Tuple
+
+from alexBot import metrics
+from alexBot.tools import TokenBucket
+
+# idle buckets are dropped once there are this many
+MAX_BUCKETS = 1000
+
+
+class RateLimited(Exception):
+    pass
+
+
+class FairScheduler:
+    """
+    runs at most `concurrency` jobs at once, sharing the slots fairly between guilds, with start time fair queuing:
+    each job is tagged with when it would start if every busy guild got its share (scaled by the guild's weight),
+    and the lowest tag runs next. so one guild posting 20 links only delays other guilds by one job each.
+
+    guilds and users also get a token bucket each, and jobs past their rate are refused with RateLimited.
+    jobs with the same key as one already running wait for it to finish first, so they can reuse its result.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        guildRate: Tuple[float, float],
+        userRate: Tuple[float, float],
+        weights: Optional[Dict[Optional[int], float]] = None,
+    ):
+        self.concurrency = concurrency
+        # (tokens per second, burst)
+        self.guildRate = guildRate
+        self.userRate = userRate
+        self.weights = weights or {}
+        self.running = 0
+        self._queue: List[Tuple[float, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._virtualTime = 0.0
+        self._lastTag: Dict[Optional[int], float] = {}
+        self._guildBuckets: Dict[Optional[int], TokenBucket] = {}
+        self._userBuckets: Dict[int, TokenBucket] = {}
+        self._inflight: Dict[Hashable, asyncio.Event] = {}
+        self.waitTime = metrics.register(
+            metrics.Histogram(f"alexbot_{name}_queue_wait_seconds", f"time {name} jobs wait for a slot")
+        )
+        metrics.register(metrics.Gauge(f"alexbot_{name}_queue_depth", f"{name} jobs waiting", lambda: len(self)))
+        metrics.register(metrics.Gauge(f"alexbot_{name}_running", f"{name} jobs running", lambda: self.running))
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @staticmethod
+    def _bucket(buckets: Dict, key, rate: Tuple[float, float]) -> TokenBucket:
+        if key not in buckets and len(buckets) >= MAX_BUCKETS:
+            # full buckets are the same as new ones, so forgetting them changes nothing
+            for old in [old for old, bucket in buckets.items() if bucket.full]:
+                del buckets[old]
+        if key not in buckets:
+            buckets[key] = TokenBucket(*rate)
+        return buckets[key]
+
+    def _admit(self, guildId: Optional[int], userId: int):
+        guild = self._bucket(self._guildBuckets, guildId, self.guildRate)
+        user = self._bucket(self._userBuckets, userId, self.userRate)
+        if guild.refill() < 1 or user.refill() < 1:
+            raise RateLimited("Too many videos requested recently, try again in a minute.")
+        guild.take()
+        user.take()
+
+    async def _acquire(self, guildId: Optional[int]):
+        if self.running < self.concurrency and not self._queue:
+            self.running += 1
+            return
+        weight = self.weights.get(guildId, 1.0)
+        tag = max(self._virtualTime, self._lastTag.get(guildId, 0.0)) + 1 / weight
+        self._lastTag[guildId] = tag
+        started = time.monotonic()
+        turn = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (tag, next(self._order), turn))
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # we were handed a slot just as we were cancelled, pass it on
+                self._release()
+            raise
+        finally:
+            self.waitTime.observe(time.monotonic() - started)
+
+    def _release(self):
+        while self._queue:
+            tag, _, turn = heapq.heappop(self._queue)
+            if turn.done():
+                continue  # cancelled while waiting
+            self._virtualTime = tag
+            turn.set_result(None)
+            return
+        self.running -= 1
+        if not self.running:
+            # nothing queued or running, so nobody is owed anything
+            self._virtualTime = 0.0
+            self._lastTag.clear()
+
+    @asynccontextmanager
+    async def job(self, guildId: Optional[int], userId: int, key: Hashable) -> AsyncIterator[None]:
+        """wait for a turn to run the job with `key`, for a user in a guild. raises RateLimited if they're over"""
+        self._admit(guildId, userId)
+        while key in self._inflight:
+            await self._inflight[key].wait()
+        done = self._inflight[key] = asyncio.Event()
+        try:
+            await self._acquire(guildId)
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            del self._inflight[key]
+            done.set()
@@ -1,10 +1,28 @@
+import asyncio
 import datetime
 import functools
+import heapq
+import inspect
 import math
 import posixpath
 import time
 from functools import wraps
-from typing import TYPE_CHECKING, Callable, Generator, Iterable, Sequence, Tuple, TypeVar, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from urllib.parse import urlparse
 
 import discord
@@ -23,6 +41,7 @@ from discord.ext import commands
 log = getLogger(__name__)
 
 _T = TypeVar("_T")
+_K = TypeVar("_K", bound=Hashable)
 
 
 def render_voiceState(member: discord.Member) -> str:
@@ -55,6 +74,36 @@ def convert_to_bool(argument: str) -> bool:
 
 
 class InteractionPaginator(PaginatorInterface):
+    def __init__(self, *args, **kwargs):
+        # set every time a page is rendered, so `feed` knows the reader moved
+        self.page_changed = asyncio.Event()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def send_kwargs(self) -> Dict[str, Any]:
+        self.page_changed.set()
+        return super().send_kwargs
+
+    async def feed(self, lines: AsyncIterator[str], lookahead: int = 1):
+        """
+        add lines from `lines` as the reader pages through, keeping at most `lookahead` pages past the one shown.
+        stops when `lines` runs out, or the interface is closed / times out.
+        """
+        async for line in lines:
+            if self.closed:
+                return
+            # not self.add_line, that would drag a reader on the last page along to the new one
+            self.paginator.add_line(line)
+            self.send_lock.set()
+            while self.page_count - self.display_page > lookahead + 1:
+                self.page_changed.clear()
+                try:
+                    await asyncio.wait_for(self.page_changed.wait(), timeout=self.timeout_length)
+                except asyncio.TimeoutError:
+                    return
+                if self.closed:
+                    return
+
     # send_interaction takes an interaction and uses that to send the paginator
     async def send_interaction(self, interaction: discord.Interaction):
         await interaction.response.send_message(
@@ -71,6 +120,85 @@ class InteractionPaginator(PaginatorInterface):
         return self
 
 
+class DeadlineQueue(Generic[_K]):
+    """
+    a min-heap of keys ordered by an aware datetime deadline, that can be awaited until the next key is due.
+    adding a key that's already queued moves it to the new deadline. removed / moved entries are dropped lazily.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime.datetime, _K]] = []
+        self._deadlines: Dict[_K, datetime.datetime] = {}
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: _K) -> bool:
+        return key in self._deadlines
+
+    def add(self, key: _K, deadline: datetime.datetime):
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        self._changed.set()
+
+    def remove(self, key: _K):
+        if self._deadlines.pop(key, None) is not None:
+            self._changed.set()
+
+    def _is_live(self, deadline: datetime.datetime, key: _K) -> bool:
+        return self._deadlines.get(key) == deadline
+
+    async def next_due(self) -> List[_K]:
+        """sleep until the earliest deadline has passed, then pop and return every key that is due."""
+        while True:
+            while self._heap and not self._is_live(*self._heap[0]):
+                heapq.heappop(self._heap)
+            self._changed.clear()
+            timeout = None
+            if self._heap:
+                now = datetime.datetime.now(datetime.UTC)
+                timeout = (self._heap[0][0] - now).total_seconds()
+                if timeout <= 0:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        deadline, key = heapq.heappop(self._heap)
+                        if self._is_live(deadline, key):
+                            del self._deadlines[key]
+                            due.append(key)
+                    return due
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class TokenBucket:
+    """refills at `rate` tokens a second, up to `capacity`. starts full."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    @property
+    def full(self) -> bool:
+        return self.refill() >= self.capacity
+
+    def take(self, tokens: float = 1) -> bool:
+        if self.refill() < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
 class Cog(commands.Cog):
     """The Cog base class that all cogs should inherit from."""
 
@@ -124,6 +252,19 @@ def timing(log=None):
         a decorator to log how long a function takes to execute.
         """
 
+        if inspect.iscoroutinefunction(function):
+
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                prt(f"starting {function.__name__}..")
+                ts = time.time()
+                result = await function(*args, **kwargs)
+                te = time.time()
+                prt(f"{function.__name__} completed, took {te - ts} seconds")
+                return result
+
+            return async_wrapper
+
         @wraps(function)
         def wrapper(*args, **kwargs):
             prt(f"starting {function.__name__}..")
@@ -138,6 +279,18 @@ def timing(log=None):
     return inner_function
 
 
+def next_occurrence(
+    start: datetime.datetime, frequency: datetime.timedelta, now: datetime.datetime
+) -> datetime.datetime:
+    """
+    the first time at or after `now` in the series start, start + frequency, start + 2 * frequency...
+    returns start unchanged if it isn't before now.
+    """
+    if start >= now:
+        return start
+    return start + math.ceil((now - start) / frequency) * frequency
+
+
 def grouper(iterable: Sequence[_T], n: int) -> Generator[Sequence[_T], None, None]:
     """
     given a iterable, yield that iterable back in chunks of size n. last item will be any size.
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from alexBot.tools import timing
+
+log = logging.getLogger(__name__)
+
+MAX_VIDEO_LENGTH = 5 * 60  # 5 Minutes
+# leave room for container overhead and rate control wobble
+SIZE_HEADROOM = 0.95
+# how many times to re-encode with a smaller budget when the output still doesn't fit
+MAX_ATTEMPTS = 3
+# fast, software only. quality per bit is worse than the slower presets, but encodes are several times faster
+PRESET = "veryfast"
+
+# candidate output heights, largest first. the largest one the bitrate can fill is picked
+HEIGHTS = (1080, 720, 540, 480, 360, 240)
+# bits per pixel per frame that still look ok in h264 at these presets
+MIN_BITS_PER_PIXEL = 0.06
+# with this much to spare, a single CRF pass capped at the bitrate is close enough and skips the first pass
+CRF_BITS_PER_PIXEL = 0.15
+CRF = 23
+# below this there is nothing worth watching left
+MIN_VIDEO_BITRATE = 100 * 1000
+
+FFPROBE_CMD = (
+    'ffprobe -v error -show_entries format=duration:stream=codec_type,width,height,avg_frame_rate,channels -of json'
+)
+# seconds. ffprobe only reads the headers, anything slower than this is stuck
+PROBE_TIMEOUT = 30
+# seconds ffmpeg can go without reporting progress before it's considered stuck and killed
+STALL_TIMEOUT = 60
+# seconds between progress callbacks, so callers editing messages don't hit rate limits
+PROGRESS_INTERVAL = 3
+
+
+class VideoTooLong(Exception):
+    pass
+
+
+class TranscodeQueueFull(Exception):
+    pass
+
+
+@dataclass
+class MediaInfo:
+    duration: float
+    width: int = 0
+    height: int = 0
+    fps: float = 30.0
+    audioChannels: int = 0
+
+
+@dataclass
+class EncodePlan:
+    videoBitrate: int
+    audioBitrate: int
+    height: Optional[int]  # None keeps the source size
+    fps: Optional[int]  # None keeps the source frame rate
+    twoPass: bool
+
+
+async def probe(input: str) -> MediaInfo:
+    command = FFPROBE_CMD.split(' ') + [input]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        async with asyncio.timeout(PROBE_TIMEOUT):
+            stdout, stderr = await process.communicate()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    data = json.loads(stdout)
+    info = MediaInfo(duration=float(data['format']['duration']))
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and not info.height:
+            info.width, info.height = stream.get('width', 0), stream.get('height', 0)
+            num, _, den = stream.get('avg_frame_rate', '30/1').partition('/')
+            if float(den or 1) and float(num):
+                info.fps = float(num) / float(den or 1)
+        elif stream.get('codec_type') == 'audio' and not info.audioChannels:
+            info.audioChannels = stream.get('channels', 2)
+    return info
+
+
+def plan_encode(info: MediaInfo, limit: float, force_two_pass: bool = False) -> EncodePlan:
+    """pick bitrates, a resolution and frame rate, and a rate control mode, for `info` to fit in `limit` bytes"""
+    if info.duration > MAX_VIDEO_LENGTH:
+        raise VideoTooLong('Video is too large.')
+    total_bitrate = limit * 8 * SIZE_HEADROOM / max(info.duration, 1)
+    audio_bitrate = 0
+    if info.audioChannels:
+        audio_bitrate = 48 * 1000 if info.audioChannels == 1 else 64 * 1000
+    video_bitrate = int(total_bitrate - audio_bitrate)
+    if video_bitrate < MIN_VIDEO_BITRATE:
+        raise VideoTooLong('Video is too long to fit in the upload limit.')
+
+    def bits_per_pixel(height: int, fps: float) -> float:
+        width = info.width * height / info.height if info.height else height * 16 / 9
+        return video_bitrate / (width * height * fps)
+
+    fps = info.fps
+    capped_fps = None
+    if fps > 30 and bits_per_pixel(min(info.height or 720, 720), fps) < MIN_BITS_PER_PIXEL:
+        # high frame rate clips spend their bits on frames. cap them at 30 before losing resolution
+        fps = capped_fps = 30
+    height = None
+    if not info.height or bits_per_pixel(info.height, fps) < MIN_BITS_PER_PIXEL:
+        # scale down to the biggest size the bitrate can fill, or as small as we go
+        for candidate in HEIGHTS:
+            if info.height and candidate >= info.height:
+                continue
+            height = candidate
+            if bits_per_pixel(candidate, fps) >= MIN_BITS_PER_PIXEL:
+                break
+    plain = bits_per_pixel(height or info.height or 720, fps) >= CRF_BITS_PER_PIXEL
+    return EncodePlan(video_bitrate, audio_bitrate, height, capped_fps, twoPass=force_two_pass or not plain)
+
+
+def ffmpeg_commands(input: str, output: str, plan: EncodePlan) -> List[List[str]]:
+    filters = []
+    if plan.height:
+        filters.append(f"scale=-2:{plan.height}")
+    if plan.fps:
+        filters.append(f"fps={plan.fps}")
+    video = ['-c:v', 'libx264', '-preset', PRESET, '-pix_fmt', 'yuv420p']
+    if filters:
+        video += ['-vf', ','.join(filters)]
+    audio = ['-c:a', 'aac', '-b:a', str(plan.audioBitrate)] if plan.audioBitrate else ['-an']
+    base = ['ffmpeg', '-v', 'error', '-nostats', '-progress', 'pipe:1', '-y', '-i', input]
+    if not plan.twoPass:
+        rate = ['-crf', str(CRF), '-maxrate', str(plan.videoBitrate), '-bufsize', str(plan.videoBitrate * 2)]
+        return [base + video + rate + audio + ['-movflags', '+faststart', output]]
+    passlog = os.path.join(os.path.dirname(output), 'ffmpeg2pass')
+    rate = ['-b:v', str(plan.videoBitrate), '-passlogfile', passlog]
+    return [
+        base + video + rate + ['-pass', '1', '-an', '-f', 'null', os.devnull],
+        base + video + rate + ['-pass', '2'] + audio + ['-movflags', '+faststart', output],
+    ]
+
+
+async def _run(command: List[str], on_progress: Optional[Callable[[float], Awaitable[None]]] = None):
+    """
+    run an ffmpeg command, passing the seconds of output written so far to `on_progress` every PROGRESS_INTERVAL.
+    ffmpeg is killed if it stops reporting progress for STALL_TIMEOUT, or this is cancelled.
+    """
+    log.debug(f"running {' '.join(command)}")
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    errors = asyncio.create_task(process.stderr.read())
+    try:
+        reported = 0.0
+        while True:
+            # progress comes as blocks of key=value lines, every half a second or so
+            async with asyncio.timeout(STALL_TIMEOUT):
+                line = await process.stdout.readline()
+            if not line:
+                break
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if (
+                key == 'out_time_us'
+                and on_progress
+                and value.isdigit()
+                and time.monotonic() - reported > PROGRESS_INTERVAL
+            ):
+                reported = time.monotonic()
+                await on_progress(int(value) / 1_000_000)
+        await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        stderr = await errors
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+
+@timing(log=log)
+async def transcode_shrink(
+    input: str, output: str, limit: float, on_progress: Optional[Callable[[float], Awaitable[None]]] = None
+) -> str:
+    """
+    re-encode the video at `input` to fit in `limit` bytes, writing it to `output`. returns `output`.
+    if the result is still too big, it's encoded again with a budget shrunk by how much it missed.
+    `on_progress` is awaited now and then with how far through the current encode it is, from 0 to 1.
+    cancelling this kills ffmpeg.
+    """
+    try:
+        info = await probe(input)
+        budget = limit
+        for attempt in range(MAX_ATTEMPTS):
+            plan = plan_encode(info, budget, force_two_pass=attempt > 0)
+            log.debug(f"encoding {info} to fit {budget} bytes (attempt {attempt + 1}): {plan}")
+            commands = ffmpeg_commands(input, output, plan)
+            for n, command in enumerate(commands):
+
+                async def progress(seconds: float, n=n):
+                    # two pass encodes report each pass as half of the whole
+                    if on_progress:
+                        await on_progress((n + min(seconds / max(info.duration, 1), 1)) / len(commands))
+
+                await _run(command, progress)
+            size = os.path.getsize(output)
+            if size <= limit:
+                return output
+            log.warning(f"encode came out {size} bytes, over the {limit} byte limit")
+            budget = budget * limit / size * SIZE_HEADROOM
+        raise Exception(f"could not fit the video in {limit} bytes after {MAX_ATTEMPTS} tries")
+    except VideoTooLong:
+        raise
+    except Exception as e:
+        raise Exception('Exception occurred transcoding video', traceback.format_exc())
+
+
+class TranscodeService:
+    """
+    runs at most `workers` transcodes at once, first come first served, with up to `maxQueued` more waiting.
+    ffmpeg runs in its own process and is supervised from the event loop, so no threads are tied up while it works.
+    """
+
+    def __init__(self, workers: int, maxQueued: int):
+        self.workers = workers
+        self.maxQueued = maxQueued
+        self.running = 0
+        self.waiting: List[object] = []
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # wake everyone waiting on the current event, later waiters get a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def transcode(
+        self,
+        input: str,
+        output: str,
+        limit: float,
+        on_position: Optional[Callable[[int], Awaitable[None]]] = None,
+        on_progress: Optional[Callable[[float], Awaitable[None]]] = None,
+    ) -> str:
+        """
+        queue a transcode_shrink, and wait for it. `on_position` is awaited with the job's place in line
+        whenever that changes while it waits, and `on_progress` is passed on to transcode_shrink.
+        cancelling this kills the encode.
+        """
+        if len(self.waiting) >= self.maxQueued:
+            raise TranscodeQueueFull(f"{len(self.waiting)} videos are already waiting to be encoded.")
+        ticket = object()
+        self.waiting.append(ticket)
+        try:
+            reported = None
+            while self.running >= self.workers or self.waiting[0] is not ticket:
+                changed = self._changed
+                position = self.waiting.index(ticket) + 1
+                if on_position and position != reported:
+                    reported = position
+                    await on_position(position)
+                await changed.wait()
+        finally:
+            self.waiting.remove(ticket)
+            self._notify()
+
+        self.running += 1
+        try:
+            return await transcode_shrink(input, output, limit, on_progress)
+        finally:
+            self.running -= 1
+            self._notify()
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import subprocess
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from alexBot import metrics
+from alexBot.executors import NamedExecutor
+
+log = logging.getLogger(__name__)
+
+# whisper wants 16kHz mono, and works on 30 second windows
+SAMPLE_RATE = 16000
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+# seconds. decoding a voice message should take a fraction of this
+DECODE_TIMEOUT = 60
+# the same cutoffs whisper's own transcribe uses to decide a window is silence
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+# voice activity detection, for cutting long clips into pieces that can be transcribed one after another.
+# loudness is measured over frames of this many samples (30ms), and frames quieter than SILENCE_RATIO of the
+# loud end of the clip (or MIN_SPEECH_RMS, whichever is more) count as silence
+VAD_FRAME = SAMPLE_RATE * 30 // 1000
+SILENCE_RATIO = 0.1
+MIN_SPEECH_RMS = 0.01
+# seconds. the first piece is short so there's something to show quickly, the rest use most of whisper's window
+FIRST_CHUNK = (2, 8)
+CHUNK = (10, 28)
+
+# the models clips can be transcribed with, fastest (and least accurate) first
+MODELS = ("tiny", "base", "small")
+# seconds. clips this short get the next model up when nothing else is waiting, longer than LONG_CLIP the next down
+SHORT_CLIP = 15
+LONG_CLIP = 60
+# clips waiting for the worker before everything steps down a model, and again at twice this
+BUSY_QUEUE = 4
+
+DECODE_CMD = f'ffmpeg -v error -nostdin -i pipe:0 -f f32le -ac 1 -ar {SAMPLE_RATE} pipe:1'
+
+
+async def decode_audio(data: bytes) -> np.ndarray:
+    """decode any audio ffmpeg understands (voice messages are ogg/opus) straight to 16kHz mono float32 samples"""
+    command = DECODE_CMD.split(' ')
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        async with asyncio.timeout(DECODE_TIMEOUT):
+            stdout, stderr = await process.communicate(data)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return np.frombuffer(stdout, np.float32)
+
+
+def split_on_silence(samples: np.ndarray) -> List[np.ndarray]:
+    """
+    cut a clip into pieces that each fit in one whisper window, at pauses in the speech where there are any.
+    each cut is made in the middle of the longest silence within the allowed piece length, or at the quietest
+    frame if there's no silence at all.
+    """
+    frames = len(samples) // VAD_FRAME
+    if not frames:
+        return [samples]
+    rms = np.sqrt(np.mean(samples[: frames * VAD_FRAME].reshape(frames, VAD_FRAME) ** 2, axis=1))
+    silent = rms < max(MIN_SPEECH_RMS, SILENCE_RATIO * np.percentile(rms, 95))
+    framesPerSecond = SAMPLE_RATE / VAD_FRAME
+    chunks = []
+    start = 0
+    shortest, longest = FIRST_CHUNK
+    while len(samples) - start * VAD_FRAME > longest * SAMPLE_RATE:
+        lo, hi = start + int(shortest * framesPerSecond), start + int(longest * framesPerSecond)
+        cut = lo + int(np.argmin(rms[lo:hi]))
+        best = 0
+        run = 0
+        for frame in range(lo, hi):
+            run = run + 1 if silent[frame] else 0
+            if run and run >= best:
+                best, cut = run, frame - run // 2
+        chunks.append(samples[start * VAD_FRAME : cut * VAD_FRAME])
+        start = cut
+        shortest, longest = CHUNK
+    chunks.append(samples[start * VAD_FRAME :])
+    return chunks
+
+
+def pick_model(duration: float, queued: int, setting: str, default: str) -> str:
+    """
+    which of MODELS to transcribe a clip of `duration` seconds with, when `queued` clips are waiting.
+    `setting` is the guild's choice: one of MODELS to always use it, or "auto" to start from `default`,
+    go up a model for short clips when the worker is free, and down for long clips or a backed up queue
+    """
+    if setting in MODELS:
+        return setting
+    tier = MODELS.index(default) if default in MODELS else 1
+    if duration <= SHORT_CLIP and not queued:
+        tier += 1
+    if duration > LONG_CLIP:
+        tier -= 1
+    if queued >= BUSY_QUEUE:
+        tier -= 1
+    if queued >= BUSY_QUEUE * 2:
+        tier -= 1
+    return MODELS[max(0, min(tier, len(MODELS) - 1))]
+
+
+# everything below here runs in the transcription worker process.
+# whisper (and torch) are only imported there, the bot itself never needs them.
+# models are loaded the first time they're used, and kept
+_models: Dict[str, object] = {}
+
+
+def _load_model(name: str):
+    import whisper
+
+    if name not in _models:
+        _models[name] = whisper.load_model(name)
+        log.info(f"loaded whisper model {name} on {_models[name].device}")
+    return _models[name]
+
+
+def _transcribe_batch(name: str, clips: List[np.ndarray]) -> List[str]:
+    """
+    clips that fit in one window are decoded together in one batch, which is most voice messages.
+    longer ones go through whisper's transcribe, one at a time
+    """
+    import torch
+    import whisper
+
+    model = _load_model(name)
+    fp16 = model.device.type == "cuda"
+    results: List[Optional[str]] = [None] * len(clips)
+    short = [n for n, clip in enumerate(clips) if len(clip) <= WINDOW_SAMPLES]
+    if short:
+        mels = torch.stack(
+            [
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(clips[n])), model.dims.n_mels)
+                for n in short
+            ]
+        ).to(model.device)
+        options = whisper.DecodingOptions(fp16=fp16, without_timestamps=True)
+        for n, result in zip(short, whisper.decode(model, mels, options)):
+            silent = result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+            results[n] = "" if silent else result.text.strip()
+    for n, clip in enumerate(clips):
+        if results[n] is None:
+            results[n] = model.transcribe(clip, fp16=fp16)["text"].strip()
+    return results
+
+
+class TranscriptionService:
+    """
+    speech to text with whisper, in the bot's cpu executor, whose worker processes keep their models loaded between
+    clips. clips queue up while the worker is busy, and up to `maxBatch` of them using the same model go through it
+    together. when it's idle, a new clip waits up to `window` seconds for others to share its batch.
+    each clip's model is picked by pick_model, starting from `model`.
+    """
+
+    def __init__(self, worker: NamedExecutor, model: str, maxBatch: int, window: float):
+        self.worker = worker
+        self.defaultModel = model
+        self.maxBatch = maxBatch
+        self.window = window
+        # (model, clip, result), oldest first
+        self._pending: List[Tuple[str, np.ndarray, asyncio.Future]] = []
+        self._added = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        metrics.register(
+            metrics.Gauge("alexbot_transcription_queued", "clips waiting to be transcribed", lambda: len(self))
+        )
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self):
+        # load the default model now, so the first message doesn't wait for it
+        self.worker.executor.submit(_load_model, self.defaultModel)
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def close(self):
+        # the worker belongs to the bot, it's shut down with it
+        if self._task:
+            self._task.cancel()
+
+    def _submit(self, model: str, clip: np.ndarray) -> asyncio.Future:
+        result = asyncio.get_running_loop().create_future()
+        self._pending.append((model, clip, result))
+        self._added.set()
+        return result
+
+    async def transcribe(
+        self, audio: bytes, on_partial: Optional[Callable[[str], Awaitable[None]]] = None, setting: str = "auto"
+    ) -> str:
+        """
+        decode and transcribe a clip, waiting for its turn in the worker. `setting` is passed on to pick_model.
+        with `on_partial`, long clips are cut at pauses and transcribed piece by piece. the first piece goes on its
+        own so it comes back quickly, the rest are batched, and `on_partial` is awaited with the text so far as each
+        piece finishes.
+        """
+        clip = await decode_audio(audio)
+        duration = len(clip) / SAMPLE_RATE
+        model = pick_model(duration, len(self), setting, self.defaultModel)
+        if on_partial is None:
+            log.debug(f"transcribing {duration:.1f}s with {model}")
+            return await self._submit(model, clip)
+        chunks = split_on_silence(clip)
+        log.debug(f"transcribing {duration:.1f}s with {model} in {len(chunks)} pieces")
+        texts = [await self._submit(model, chunks[0])]
+        rest = [self._submit(model, chunk) for chunk in chunks[1:]]
+        try:
+            for result in rest:
+                await on_partial(" ".join(text for text in texts if text))
+                texts.append(await result)
+        finally:
+            for result in rest:
+                result.cancel()
+        return " ".join(text for text in texts if text)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # nobody's waiting on these anymore
+            self._pending = [entry for entry in self._pending if not entry[2].done()]
+            if not self._pending:
+                self._added.clear()
+                await self._added.wait()
+                continue
+            model = self._pending[0][0]
+            deadline = loop.time() + self.window
+            while sum(entry[0] == model for entry in self._pending) < self.maxBatch:
+                self._added.clear()
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        await self._added.wait()
+                except TimeoutError:
+                    break
+            batch = [entry for entry in self._pending if entry[0] == model and not entry[2].done()][: self.maxBatch]
+            taken = {id(entry) for entry in batch}
+            self._pending = [entry for entry in self._pending if id(entry) not in taken]
+            if not batch:
+                continue
+            log.debug(f"transcribing a batch of {len(batch)} with {model}")
+            try:
+                texts = await self.worker.run(_transcribe_batch, model, [clip for _, clip, _ in batch])
+            except Exception as e:
+                for _, _, result in batch:
+                    if not result.done():
+                        result.set_exception(e)
+                continue
+            for (_, _, result), text in zip(batch, texts):
+                if not result.done():
+                    result.set_result(text)
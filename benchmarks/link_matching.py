@@ -0,0 +1,88 @@
+"""
+how long finding mirrorable links takes per message: find_video_links' single precompiled regex, against the loop
+over DOMAINS with one re.search per domain that on_message used to run.
+
+messages are read from --corpus (one per line) if given, otherwise generated: mostly plain chat, with some links
+to other sites and some to supported ones, bare, in <> and in markdown.
+    python benchmarks/link_matching.py --messages 100000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alexBot.cogs.video_dl import DOMAINS, find_video_links
+
+WORDS = "the a video is so good lol look at this one when are we playing tonight i think that was funny".split()
+OTHER_LINKS = [
+    "https://netflix.com/watch/81234567",
+    "https://www.dropbox.com/s/abc/clip.mp4",
+    "https://github.com/mralext20/alex-bot/pull/1",
+    "https://en.wikipedia.org/wiki/Python_(programming_language)",
+]
+SUPPORTED_LINKS = [
+    "https://x.com/someone/status/1790000000000000000",
+    "https://vm.tiktok.com/ZMabcdef/",
+    "https://www.instagram.com/reel/Cabcdef/?igsh=abc",
+    "https://www.facebook.com/permalink.php?story_fbid=123&id=456",
+    "https://youtube.com/shorts/abcdefghijk?si=xyz",
+    "https://www.youtube.com/watch?v=abcdefghijk",
+    "https://www.reddit.com/r/videos/comments/abc/title/",
+]
+
+
+def old_find(content: str) -> Optional[str]:
+    """the per domain loop find_video_links replaced, minus its logging"""
+    for domain in DOMAINS:
+        if match := re.search(rf'(https?://[^ ]*{domain}/[^ \n]*)', content):
+            if domain in ["youtube.com", "youtu.be"]:
+                if 'shorts' in match.group(1) or 'clip' in match.group(1):
+                    return match.group(1)
+            else:
+                return match.group(1)
+    return None
+
+
+def generate(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(2, 30))
+        roll = rng.random()
+        if roll < 0.05:
+            link = rng.choice(SUPPORTED_LINKS)
+            words.insert(rng.randrange(len(words) + 1), rng.choice([link, f"<{link}>", f"[this]({link})"]))
+        elif roll < 0.15:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(OTHER_LINKS))
+        messages.append(" ".join(words))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--corpus", help="a file with one message per line, instead of generated messages")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            messages = f.read().splitlines()
+    else:
+        messages = generate(args.messages)
+
+    found = sum(bool(find_video_links(message)) for message in messages)
+    foundOld = sum(old_find(message) is not None for message in messages)
+    print(f"{len(messages)} messages, {found} with a mirrorable link ({foundOld} by the old loop)")
+    for name, function in (("find_video_links", find_video_links), ("per domain re.search", old_find)):
+        best = min(timeit.repeat(lambda: [function(message) for message in messages], number=1, repeat=args.repeat))
+        print(f"{name}: {best * 1e6 / len(messages):.2f}us per message, {len(messages) / best:,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
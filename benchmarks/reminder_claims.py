@@ -0,0 +1,116 @@
+"""
+how fast several bot processes get through a pile of due reminders between them, and that each one is claimed once.
+
+seeds --reminders due reminders, starts --processes workers that each try to claim all of them the way
+Reminders.reminder_loop does (in CLAIM_BATCH sized claim_and_skip calls, in the same order), then reports
+throughput and checks every row ended up leased exactly once. the seeded rows are deleted afterwards.
+
+needs the database from docker-compose, migrated to head, and the same environment as the bot:
+    python benchmarks/reminder_claims.py --reminders 100000 --processes 4
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select
+
+from alexBot import database as db
+from alexBot.cogs.reminders import CLAIM_BATCH, Reminders
+from alexBot.database import Reminder
+from alexBot.tools import grouper
+
+# seeded rows are told apart from real ones by their message
+MARKER = "reminder claim benchmark"
+# rows per INSERT while seeding
+SEED_BATCH = 5000
+
+
+async def seed(count: int):
+    now = datetime.datetime.now(datetime.UTC)
+    rows = [dict(target=0, owner=0, guildId=None, message=MARKER, next_remind=now) for _ in range(count)]
+    async with db.async_session() as session:
+        async with session.begin():
+            for batch in grouper(rows, SEED_BATCH):
+                await session.execute(insert(Reminder), list(batch))
+
+
+async def cleanup():
+    async with db.async_session() as session:
+        async with session.begin():
+            await session.execute(delete(Reminder).where(Reminder.message == MARKER))
+
+
+async def worker():
+    """one bot process. prints how many reminders it claimed, and how long it took"""
+    # no bot: claim_and_skip only talks to the database
+    cog = Reminders(None)
+    async with db.async_session() as session:
+        due = list(await session.scalars(select(Reminder).where(Reminder.message == MARKER)))
+    claimed = 0
+    started = time.perf_counter()
+    for batch in grouper(due, CLAIM_BATCH):
+        claimed += len(await cog.claim_and_skip(list(batch)))
+    print(json.dumps({"claimed": claimed, "seconds": time.perf_counter() - started}))
+
+
+async def check() -> tuple:
+    async with db.async_session() as session:
+        leased, holders = (
+            await session.execute(
+                select(func.count(Reminder.leased_by), func.count(func.distinct(Reminder.leased_by))).where(
+                    Reminder.message == MARKER
+                )
+            )
+        ).one()
+    return leased, holders
+
+
+async def run(count: int, processes: int):
+    await cleanup()
+    started = time.perf_counter()
+    await seed(count)
+    print(f"seeded {count} due reminders in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    workers = [
+        subprocess.Popen([sys.executable, __file__, "--worker"], stdout=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    results = [json.loads(process.communicate()[0]) for process in workers]
+    elapsed = time.perf_counter() - started
+
+    claimed = sum(result["claimed"] for result in results)
+    leased, holders = await check()
+    for n, result in enumerate(results):
+        print(f"process {n}: claimed {result['claimed']} in {result['seconds']:.2f}s")
+    print(f"{claimed} claims in {elapsed:.2f}s, {claimed / elapsed:.0f} reminders/s over {processes} processes")
+    print(f"{leased} of {count} rows leased, by {holders} processes")
+    if claimed != count or leased != count:
+        print("FAILED: reminders were claimed more than once, or not at all")
+    await cleanup()
+    await db.engine.dispose()
+    return claimed == count == leased
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reminders", type=int, default=100_000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        asyncio.run(worker())
+        return
+    sys.exit(0 if asyncio.run(run(args.reminders, args.processes)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+time-to-fit for mirror encodes: how long it takes to get each sample clip under an upload limit, how many encodes
+that took, and how close to the limit it landed. transcode_shrink (planned from ffprobe, retrying only on overshoot)
+is compared with the single pass bitrate clamp it replaced, which never retried and so could just miss.
+
+    python benchmarks/transcode_fit.py path/to/clips --limits 10 25 50
+
+limits are in MB (discord's upload limits are 10, 50 and 100). needs ffmpeg and ffprobe on the PATH.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alexBot import transcode
+from alexBot.transcode import VideoTooLong, probe, transcode_shrink
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm", ".mkv")
+# the old encode, see git history of alexBot/cogs/video_dl.py
+OLD_FFMPEG_CMD = 'ffmpeg -v error -i {0} -y -b:v {1} -maxrate:v {1} -b:a {2} -maxrate:a {2} -bufsize:v {3} {4}'
+OLD_AUDIO_BITRATE = 64 * 1000
+OLD_BUFFER_CONSTANT = 20
+
+
+async def old_encode(input: str, output: str, limit: float) -> int:
+    """the single pass clamp transcode_shrink replaced. returns how many encodes it ran (always one)"""
+    info = await probe(input)
+    bits = limit * 8
+    video = bits / math.ceil(info.duration) - OLD_AUDIO_BITRATE
+    command = OLD_FFMPEG_CMD.format(
+        input, int(video), OLD_AUDIO_BITRATE, math.floor(bits / OLD_BUFFER_CONSTANT), output
+    )
+    process = await asyncio.create_subprocess_exec(*command.split(' '))
+    await process.wait()
+    return 1
+
+
+async def new_encode(input: str, output: str, limit: float) -> int:
+    """transcode_shrink. returns how many ffmpeg runs it took, two pass encodes count as two"""
+    runs = 0
+    run = transcode._run
+
+    async def counted(*args, **kwargs):
+        nonlocal runs
+        runs += 1
+        return await run(*args, **kwargs)
+
+    transcode._run = counted
+    try:
+        await transcode_shrink(input, output, limit)
+    finally:
+        transcode._run = run
+    return runs
+
+
+async def measure(encode, input: str, limit: float) -> Optional[Tuple[float, int, int]]:
+    """(seconds, ffmpeg runs, output bytes), or None if the clip is too long to mirror. failed encodes have no output"""
+    with tempfile.TemporaryDirectory(prefix="alexbot-bench-") as workdir:
+        output = os.path.join(workdir, "out.mp4")
+        started = time.perf_counter()
+        try:
+            runs = await encode(input, output, limit)
+        except VideoTooLong:
+            return None
+        except Exception as e:
+            print(f"  {encode.__name__} failed: {str(e).splitlines()[0]}")
+            return time.perf_counter() - started, 0, 0
+        return time.perf_counter() - started, runs, os.path.getsize(output) if os.path.exists(output) else 0
+
+
+async def run(clips: List[str], limits: List[float]):
+    totals = {old_encode: [0.0, 0, 0], new_encode: [0.0, 0, 0]}  # seconds, fits, tries
+    for clip in clips:
+        size = os.path.getsize(clip)
+        for limit in limits:
+            if size <= limit:
+                continue  # already fits, never encoded
+            print(f"{os.path.basename(clip)} ({size / 1e6:.1f}MB) into {limit / 1e6:.0f}MB")
+            for encode in (old_encode, new_encode):
+                result = await measure(encode, clip, limit)
+                if result is None:
+                    continue
+                elapsed, runs, out = result
+                fits = 0 < out <= limit
+                totals[encode][0] += elapsed
+                totals[encode][1] += fits
+                totals[encode][2] += 1
+                print(
+                    f"  {encode.__name__}: {elapsed:6.1f}s, {runs} ffmpeg runs, {out / 1e6:6.2f}MB "
+                    f"({out / limit:.0%} of the limit) {'fits' if fits else 'TOO BIG'}"
+                )
+    for encode, (seconds, fits, tries) in totals.items():
+        if tries:
+            print(f"{encode.__name__}: {fits}/{tries} fit, {seconds:.1f}s total, {seconds / tries:.1f}s per encode")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="a directory of sample clips")
+    parser.add_argument("--limits", type=float, nargs="+", default=[10, 25, 50], help="upload limits, in MB")
+    args = parser.parse_args()
+    clips = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus) if name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+    if not clips:
+        sys.exit(f"no clips in {args.corpus}")
+    asyncio.run(run(clips, [limit * 1e6 for limit in args.limits]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+latency and word error rate of each transcription model setting over a local sample set: every clip in the corpus
+directory (ogg, opus, mp3, wav, m4a) with the reference transcript next to it, same name with a .txt extension.
+
+each setting (tiny, base, small and auto) is run twice: one clip at a time, which is latency on a quiet bot, and
+all clips at once, which is what a busy one sees (and where auto steps down a model).
+
+    python benchmarks/transcription_models.py path/to/samples --settings auto tiny base small
+
+needs whisper (and torch) installed, and ffmpeg on the PATH.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alexBot.executors import cpu_executor
+from alexBot.transcription import MODELS, SAMPLE_RATE, TranscriptionService, _load_model, decode_audio, pick_model
+
+AUDIO_EXTENSIONS = (".ogg", ".opus", ".mp3", ".wav", ".m4a")
+
+
+def _warm(name: str):
+    # runs in the worker. the model stays loaded there, only None comes back
+    _load_model(name)
+
+
+def words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def edit_distance(reference: List[str], hypothesis: List[str]) -> int:
+    """word level levenshtein distance: substitutions, insertions and deletions"""
+    previous = list(range(len(hypothesis) + 1))
+    for n, word in enumerate(reference, 1):
+        current = [n]
+        for m, other in enumerate(hypothesis, 1):
+            current.append(min(previous[m] + 1, current[m - 1] + 1, previous[m - 1] + (word != other)))
+        previous = current
+    return previous[-1]
+
+
+def load_samples(corpus: str) -> List[Tuple[str, bytes, str]]:
+    """(name, audio, reference) for each clip that has a transcript"""
+    samples = []
+    for name in sorted(os.listdir(corpus)):
+        stem, extension = os.path.splitext(name)
+        reference = os.path.join(corpus, stem + ".txt")
+        if extension.lower() not in AUDIO_EXTENSIONS or not os.path.exists(reference):
+            continue
+        with open(os.path.join(corpus, name), "rb") as f:
+            audio = f.read()
+        with open(reference, encoding="utf-8") as f:
+            samples.append((name, audio, f.read()))
+    return samples
+
+
+async def timed(service: TranscriptionService, audio: bytes, setting: str) -> Tuple[float, str]:
+    started = time.perf_counter()
+    text = await service.transcribe(audio, setting=setting)
+    return time.perf_counter() - started, text
+
+
+def report(label: str, samples: List[Tuple[str, bytes, str]], results: List[Tuple[float, str]], elapsed: float):
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(edit_distance(words(reference), words(text)) for (_, _, reference), (_, text) in zip(samples, results))
+    total = sum(len(words(reference)) for _, _, reference in samples)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{label:<14} p50 {statistics.median(latencies):6.2f}s  p95 {p95:6.2f}s  wall {elapsed:7.1f}s  "
+        f"WER {errors / max(total, 1):6.1%}"
+    )
+
+
+async def run(samples: List[Tuple[str, bytes, str]], settings: List[str], default: str, batch: int, window: float):
+    worker = cpu_executor(1)
+    service = TranscriptionService(worker, default, batch, window)
+    try:
+        durations: Dict[str, float] = {}
+        for name, audio, _ in samples:
+            durations[name] = len(await decode_audio(audio)) / SAMPLE_RATE
+        print(f"{len(samples)} clips, {sum(durations.values()):.0f}s of audio")
+        if "auto" in settings:
+            picked = [pick_model(durations[name], 0, "auto", default) for name, _, _ in samples]
+            print("auto on a quiet bot picks " + ", ".join(f"{model} {picked.count(model)}" for model in MODELS))
+        # model loading isn't what's being measured
+        for model in MODELS if "auto" in settings else settings:
+            await worker.run(_warm, model)
+        service.start()
+        for setting in settings:
+            started = time.perf_counter()
+            results = [await timed(service, audio, setting) for _, audio, _ in samples]
+            report(f"{setting} one by one", samples, results, time.perf_counter() - started)
+            started = time.perf_counter()
+            results = await asyncio.gather(*(timed(service, audio, setting) for _, audio, _ in samples))
+            report(f"{setting} all at once", samples, results, time.perf_counter() - started)
+    finally:
+        await service.close()
+        worker.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="a directory of clips and their reference transcripts")
+    parser.add_argument("--settings", nargs="+", default=["auto", *MODELS], choices=["auto", *MODELS])
+    parser.add_argument("--default", default="base", choices=MODELS, help="where auto starts, like whisper_model")
+    parser.add_argument("--batch", type=int, default=8, help="like transcribe_batch_size")
+    parser.add_argument("--window", type=float, default=0.25, help="like transcribe_batch_window")
+    args = parser.parse_args()
+    samples = load_samples(args.corpus)
+    if not samples:
+        sys.exit(f"no clips with transcripts in {args.corpus}")
+    asyncio.run(run(samples, args.settings, args.default, args.batch, args.window))
+
+
+if __name__ == "__main__":
+    main()
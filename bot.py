@@ -7,6 +7,7 @@ import logging
 import re
 import sys
 from pathlib import Path
+from typing import Optional
 
 import aiohttp
 import discord
@@ -14,6 +15,11 @@ from discord import app_commands
 from discord.ext import commands
 
 import config
+from alexBot.caches import GuildConfigCache, UserConfigCache
+from alexBot.classes import VoiceEvent
+from alexBot.database import RowChange, listen_for_changes
+from alexBot.executors import cpu_executor, io_executor
+from alexBot.metrics import register_cache, start_metrics_server
 
 cogs = [
     x.stem
@@ -66,6 +72,21 @@ class Bot(commands.Bot):
             name="voice", description="Voice related commands", guild_only=True
         )
         self.tree.add_command(self.voiceCommandsGroup)
+        self.guildConfigs = GuildConfigCache()
+        self.changeFeed: Optional[asyncio.Task] = None
+        self.userConfigs = UserConfigCache()
+        register_cache("guild_config", self.guildConfigs)
+        register_cache("user_config", self.userConfigs)
+        # run blocking work in these, not the loop's default executor
+        self.ioExecutor = io_executor(config.io_workers)
+        self.cpuExecutor = cpu_executor(config.cpu_workers)
+
+    async def close(self):
+        if self.changeFeed:
+            self.changeFeed.cancel()
+        await super().close()
+        self.ioExecutor.shutdown()
+        self.cpuExecutor.shutdown()
 
     async def on_ready(self):
         log.info(f'Logged on as {self.user} ({self.user.id}). prefix is {config.prefix}')
@@ -73,7 +94,39 @@ class Bot(commands.Bot):
         log.info(f'owner is {self.owner} ({self.owner.id})')
         self.session = aiohttp.ClientSession()
 
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.guildConfigs.get(guild.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.guildConfigs.invalidate(guild.id)
+
+    async def on_voice_state_update(
+        self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState
+    ):
+        # classify the update and look up configs once, then hand it to every cog as on_voice_event
+        event = VoiceEvent(member, before, after, await self.guildConfigs.get(member.guild.id))
+        if before.channel != after.channel:
+            event.userConfig = await self.userConfigs.get_or_create(member.id)
+        self.dispatch('voice_event', event)
+
+    async def handle_row_change(self, change: RowChange):
+        if change.table == 'guildconfigs':
+            await self.guildConfigs.refresh(int(change.key))
+        elif change.table == 'userconfigs':
+            await self.userConfigs.refresh(int(change.key))
+        self.dispatch('row_change', change)
+
+    async def resync_changes(self):
+        # we may have missed changes while the change feed was disconnected
+        await self.guildConfigs.load()
+        self.userConfigs.clear()
+        self.dispatch('change_feed_connect')
+
     async def cogSetup(self):
+        await self.guildConfigs.load()
+        self.changeFeed = self.loop.create_task(listen_for_changes(self.handle_row_change, self.resync_changes))
+        if config.metrics_port:
+            await start_metrics_server(config.metrics_port)
         await self.load_extension('jishaku')
 
         for cog in cogs:
@@ -4,6 +4,7 @@ load_dotenv()
 
 import json
 import os
+import tempfile
 
 google_service_account = None
 # check if file exists;
@@ -32,3 +33,47 @@ db_pw = os.environ.get("POSTGRES_PASSWORD")
 db_name = os.environ.get("POSTGRES_DB")
 db_host = os.environ.get("POSTGRES_HOST")
 db_port = os.environ.get("POSTGRES_PORT")
+
+# database connection pool, see sqlalchemy's create_engine
+db_pool_size = int(os.environ.get("DB_POOL_SIZE", 5))
+db_max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+db_pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+db_pool_pre_ping = os.environ.get("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# prepared statements kept per connection
+db_statement_cache_size = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+
+# serve prometheus metrics at http://0.0.0.0:METRICS_PORT/metrics. unset to disable
+metrics_port = int(os.environ["METRICS_PORT"]) if os.environ.get("METRICS_PORT") else None
+
+# blocking work is split between a thread pool for I/O and a process pool for CPU bound python (speech recognition).
+# each cpu worker keeps its own copy of the whisper models it has used loaded, so keep it small
+io_workers = int(os.environ.get("IO_WORKERS", 4))
+cpu_workers = int(os.environ.get("CPU_WORKERS", 1))
+
+# voice message transcription runs in the cpu executor, where models stay loaded, and messages that arrive
+# together are transcribed in batches of up to transcribe_batch_size, waiting up to the window (seconds) for company.
+# whisper_model is where guilds with transcriptionModel=auto start, see transcription.pick_model
+whisper_model = os.environ.get("WHISPER_MODEL", "base")
+transcribe_batch_size = int(os.environ.get("TRANSCRIBE_BATCH_SIZE", 8))
+transcribe_batch_window = float(os.environ.get("TRANSCRIBE_BATCH_WINDOW", 0.25))
+
+# video mirror encodes. ffmpeg uses several threads per encode, so by default run one per two cores
+transcode_workers = int(os.environ.get("TRANSCODE_WORKERS") or max(1, (os.cpu_count() or 2) // 2))
+transcode_queue_size = int(os.environ.get("TRANSCODE_QUEUE_SIZE", 16))
+
+# finished video mirrors are kept here, so links posted again don't need to be downloaded or encoded again.
+# each bot process locks its cache directory. others on the same machine get their own next to it (mirrors-1, ...)
+mirror_cache_dir = os.environ.get("MIRROR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "alexbot", "mirrors")
+mirror_cache_size = int(os.environ.get("MIRROR_CACHE_SIZE", 2 * 1024 * 1024 * 1024))
+
+# short voice tts phrases are kept here as opus, so repeating them doesn't call google or ffmpeg again
+tts_cache_dir = os.environ.get("TTS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "alexbot", "tts")
+tts_cache_size = int(os.environ.get("TTS_CACHE_SIZE", 256 * 1024 * 1024))
+
+# video mirrors run at most this many at once, shared fairly between guilds
+mirror_concurrency = int(os.environ.get("MIRROR_CONCURRENCY", 4))
+# and each guild / user can start this many per minute, with bursts of up to the burst size
+mirror_guild_per_minute = float(os.environ.get("MIRROR_GUILD_PER_MINUTE", 6))
+mirror_guild_burst = int(os.environ.get("MIRROR_GUILD_BURST", 10))
+mirror_user_per_minute = float(os.environ.get("MIRROR_USER_PER_MINUTE", 2))
+mirror_user_burst = int(os.environ.get("MIRROR_USER_BURST", 4))
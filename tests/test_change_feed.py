@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import json
+from typing import Callable, Dict, List
+
+import pytest
+
+from alexBot import database
+from alexBot.database import CHANGE_FEED_MAX_BACKOFF, CHANGE_FEED_MIN_BACKOFF, CHANGES_CHANNEL, RowChange
+
+
+class FakeConnection:
+    """stands in for an asyncpg connection: notifications and dropping the connection are driven by the test"""
+
+    def __init__(self):
+        self.listeners: Dict[str, Callable] = {}
+        self.terminationListeners: List[Callable] = []
+        self.closed = False
+
+    def add_termination_listener(self, callback: Callable):
+        self.terminationListeners.append(callback)
+
+    async def add_listener(self, channel: str, callback: Callable):
+        self.listeners[channel] = callback
+
+    async def close(self):
+        self.closed = True
+
+    def notify(self, payload: str):
+        self.listeners[CHANGES_CHANNEL](self, 4242, CHANGES_CHANNEL, payload)
+
+    def terminate(self):
+        for callback in self.terminationListeners:
+            callback(self)
+
+
+class ChangeFeed:
+    """runs listen_for_changes against FakeConnections. each connect attempt takes the next item of `attempts`"""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, attempts: list):
+        self.attempts = attempts
+        self.connections: List[FakeConnection] = []
+        self.changes: List[RowChange] = []
+        self.connects = 0
+        self.failConnects = 0
+        self.delays: List[float] = []
+        self.connected = asyncio.Event()
+        monkeypatch.setattr(database.asyncpg, "connect", self.connect)
+        sleep = asyncio.sleep
+
+        async def no_wait(delay, *args, **kwargs):
+            # backoff is recorded, not waited out
+            if delay:
+                self.delays.append(delay)
+            await sleep(0)
+
+        monkeypatch.setattr(database.asyncio, "sleep", no_wait)
+
+    async def connect(self, dsn: str) -> FakeConnection:
+        attempt = self.attempts.pop(0)
+        if isinstance(attempt, Exception):
+            raise attempt
+        self.connections.append(attempt)
+        return attempt
+
+    async def on_change(self, change: RowChange):
+        self.changes.append(change)
+
+    async def on_connect(self):
+        self.connects += 1
+        if self.failConnects:
+            self.failConnects -= 1
+            raise RuntimeError("resync failed")
+        self.connected.set()
+
+    async def settle(self):
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+    async def wait_connected(self):
+        await asyncio.wait_for(self.connected.wait(), 1)
+        self.connected.clear()
+
+
+def run(test):
+    """the tests are coroutines, run each in a fresh event loop"""
+
+    @functools.wraps(test)
+    def wrapper(monkeypatch):
+        asyncio.run(test(monkeypatch))
+
+    return wrapper
+
+
+@run
+async def test_notifications_reach_on_change(monkeypatch):
+    connection = FakeConnection()
+    feed = ChangeFeed(monkeypatch, [connection])
+    task = asyncio.create_task(database.listen_for_changes(feed.on_change, feed.on_connect))
+    await feed.wait_connected()
+
+    connection.notify(json.dumps({"table": "reminders", "op": "INSERT", "key": "abc"}))
+    connection.notify("not json")
+    connection.notify(json.dumps({"table": "reminders"}))
+    connection.notify(json.dumps({"table": "userconfigs", "op": "UPDATE", "key": "42"}))
+    await feed.settle()
+    task.cancel()
+
+    assert feed.changes == [RowChange("reminders", "INSERT", "abc"), RowChange("userconfigs", "UPDATE", "42")]
+
+
+@run
+async def test_handler_errors_dont_stop_the_feed(monkeypatch):
+    connection = FakeConnection()
+    feed = ChangeFeed(monkeypatch, [connection])
+    calls = []
+
+    async def on_change(change: RowChange):
+        calls.append(change)
+        if len(calls) == 1:
+            raise RuntimeError("handler failed")
+
+    task = asyncio.create_task(database.listen_for_changes(on_change, feed.on_connect))
+    await feed.wait_connected()
+    connection.notify(json.dumps({"table": "reminders", "op": "DELETE", "key": "1"}))
+    connection.notify(json.dumps({"table": "reminders", "op": "DELETE", "key": "2"}))
+    await feed.settle()
+
+    assert [change.key for change in calls] == ["1", "2"]
+    assert not task.done()
+    task.cancel()
+
+
+@run
+async def test_resyncs_after_reconnect(monkeypatch):
+    first, second = FakeConnection(), FakeConnection()
+    feed = ChangeFeed(monkeypatch, [first, second])
+    task = asyncio.create_task(database.listen_for_changes(feed.on_change, feed.on_connect))
+    await feed.wait_connected()
+    assert feed.connects == 1
+
+    first.terminate()
+    await feed.wait_connected()
+    task.cancel()
+
+    # on_connect runs again on the new connection, so callers can catch up on what they missed
+    assert feed.connects == 2
+    assert first.closed
+    assert CHANGES_CHANNEL in second.listeners
+    # a clean reconnect doesn't wait
+    assert feed.delays == []
+
+
+@run
+async def test_backs_off_while_the_database_is_down(monkeypatch):
+    attempts = [OSError("refused")] * 8 + [FakeConnection()]
+    feed = ChangeFeed(monkeypatch, attempts)
+    task = asyncio.create_task(database.listen_for_changes(feed.on_change, feed.on_connect))
+    await feed.wait_connected()
+    task.cancel()
+
+    expected = []
+    delay = CHANGE_FEED_MIN_BACKOFF
+    for _ in range(8):
+        expected.append(delay)
+        delay = min(delay * 2, CHANGE_FEED_MAX_BACKOFF)
+    assert feed.delays == expected
+    assert feed.delays[-1] == CHANGE_FEED_MAX_BACKOFF
+
+
+@run
+async def test_backoff_resets_once_connected(monkeypatch):
+    first, second = FakeConnection(), FakeConnection()
+    feed = ChangeFeed(monkeypatch, [OSError("refused"), OSError("refused"), first, OSError("refused"), second])
+    task = asyncio.create_task(database.listen_for_changes(feed.on_change, feed.on_connect))
+    await feed.wait_connected()
+    first.terminate()
+    await feed.wait_connected()
+    task.cancel()
+
+    assert feed.delays == [CHANGE_FEED_MIN_BACKOFF, CHANGE_FEED_MIN_BACKOFF * 2, CHANGE_FEED_MIN_BACKOFF]
+
+
+@run
+async def test_failed_resync_reconnects(monkeypatch):
+    first, second = FakeConnection(), FakeConnection()
+    feed = ChangeFeed(monkeypatch, [first, second])
+    feed.failConnects = 1
+    task = asyncio.create_task(database.listen_for_changes(feed.on_change, feed.on_connect))
+    await feed.wait_connected()
+    task.cancel()
+
+    # the connection that couldn't resync is dropped, and the next one resyncs again
+    assert feed.connects == 2
+    assert first.closed
+    assert feed.delays == [CHANGE_FEED_MIN_BACKOFF]